@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# SuperGenPass asyncio load test
+# Copyright (C) 2012-2013  Vianney le Clément de Saint-Marcq <vleclement@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Measure the latency of an asyncio loop while derivations are in flight.
+
+A ticker coroutine sleeps for 1 millisecond over and over and records how
+late it wakes up, while thousands of derivations run: inline in the loop
+(what the asyncio interface avoids), in the default thread pool and in a
+process pool, both through agenerate (one task per derivation, bounded by a
+semaphore) and agenerate_many. The lateness of the ticker is the latency
+any other connection served by the loop would suffer. Run from the root of
+the source tree:
+
+    python benchmarks/aio_load.py [-n COUNT] [-a ALGORITHM] [--budget MS]
+
+The check fails (exit status 1) if the 99th percentile of the lateness in
+the process pool exceeds the budget.
+
+"""
+
+import os.path
+import sys
+import argparse
+import asyncio
+import concurrent.futures
+import statistics
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import supergenpass
+from supergenpass import aio
+
+
+master = "master password"
+tick = 0.001
+
+
+async def ticker(lateness, stop):
+    """Record in lateness how late each tick wakes up, in seconds."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(tick)
+        lateness.append(time.perf_counter() - start - tick)
+
+
+async def inline(domains, algorithm, executor):
+    for domain in domains:
+        supergenpass.generate(master, domain, 10, algorithm)
+        await asyncio.sleep(0)
+
+
+async def tasks(domains, algorithm, executor):
+    semaphore = asyncio.Semaphore(64)
+    await asyncio.gather(*(aio.agenerate(master, domain, 10, algorithm,
+                                         executor=executor,
+                                         semaphore=semaphore)
+                           for domain in domains))
+
+
+async def many(domains, algorithm, executor):
+    requests = [(domain, 10, algorithm) for domain in domains]
+    async for _ in aio.agenerate_many(master, requests, executor=executor):
+        pass
+
+
+async def measure(load, domains, algorithm, executor):
+    """Return the elapsed time and the lateness of the ticker during load."""
+    lateness = []
+    stop = asyncio.Event()
+    ticking = asyncio.ensure_future(ticker(lateness, stop))
+    await asyncio.sleep(0.05)
+    del lateness[:]
+    start = time.perf_counter()
+    await load(domains, algorithm, executor)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await ticking
+    return elapsed, lateness
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.description = "Measure the latency of an asyncio loop under a " \
+                         "load of derivations."
+    parser.add_argument("-n", "--count", type=int, default=5000,
+                        help="number of derivations (default: %(default)s)")
+    parser.add_argument("-a", "--algorithm", default='md5',
+                        help="hash algorithm (default: %(default)s)")
+    parser.add_argument("-j", "--jobs", type=int,
+                        help="number of worker processes (default: number "
+                             "of CPUs)")
+    parser.add_argument("--budget", type=float, default=20, metavar="MS",
+                        help="budget for the 99th percentile of the lateness "
+                             "with a process pool, in milliseconds (default: "
+                             "%(default)s)")
+    args = parser.parse_args()
+    domains = ["example{}.com".format(i) for i in range(args.count)]
+
+    async def run():
+        with concurrent.futures.ProcessPoolExecutor(args.jobs) as pool:
+            # start the workers before measuring
+            await aio.agenerate(master, "example.com", executor=pool)
+            runs = [("inline", inline, None),
+                    ("threads/agenerate", tasks, None),
+                    ("threads/agenerate_many", many, None),
+                    ("processes/agenerate", tasks, pool),
+                    ("processes/agenerate_many", many, pool)]
+            results = {}
+            print("{:26} {:>9} {:>9} {:>9} {:>9}".format(
+                "mode", "time", "lag p50", "lag p99", "lag max"))
+            for name, load, executor in runs:
+                elapsed, lateness = await measure(load, domains,
+                                                  args.algorithm, executor)
+                results[name] = percentile(lateness, 99)
+                print("{:26} {:8.0f}ms {:7.2f}ms {:7.2f}ms {:7.2f}ms".format(
+                    name, elapsed * 1e3,
+                    statistics.median(lateness) * 1e3,
+                    percentile(lateness, 99) * 1e3, max(lateness) * 1e3))
+            return results
+
+    results = asyncio.run(run())
+    status = 0
+    for name, p99 in results.items():
+        if name.startswith("processes/") and p99 * 1e3 > args.budget:
+            print("FAIL: {} lag over budget".format(name), file=sys.stderr)
+            status = 1
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
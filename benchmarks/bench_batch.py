@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# SuperGenPass batch derivation scaling benchmark
+# Copyright (C) 2012-2013  Vianney le Clément de Saint-Marcq <vleclement@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Measure the throughput of supergenpass.batch with 1, 2, 4 and 8 workers.
+
+Run from the root of the source tree:
+
+    python benchmarks/bench_batch.py [COUNT]
+
+"""
+
+import os.path
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from supergenpass.batch import generate_many, generate_pins_many
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    passwords = [("example{}.com".format(i), 10, 'md5') for i in range(count)]
+    pins = [("example{}.com".format(i), 4) for i in range(count)]
+    print("{} requests, {} CPUs".format(count, os.cpu_count()))
+    print("{:>7} {:>14} {:>14}".format("workers", "passwords/s", "PINs/s"))
+    for workers in (1, 2, 4, 8):
+        start = time.perf_counter()
+        for _ in generate_many("master password", passwords, workers=workers):
+            pass
+        password_rate = count / (time.perf_counter() - start)
+        start = time.perf_counter()
+        for _ in generate_pins_many("master password", pins, workers=workers):
+            pass
+        pin_rate = count / (time.perf_counter() - start)
+        print("{:7d} {:14.0f} {:14.0f}".format(workers, password_rate,
+                                               pin_rate))
+
+
+if __name__ == '__main__':
+    main()
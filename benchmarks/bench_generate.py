@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# SuperGenPass password generation micro-benchmark
+# Copyright (C) 2012-2013  Vianney le Clément de Saint-Marcq <vleclement@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Compare supergenpass.generate against the reference implementation.
+
+Run from the root of the source tree:
+
+    python benchmarks/bench_generate.py
+
+"""
+
+import os.path
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import supergenpass
+import reference
+
+
+algorithms = ['md5', 'sha256']
+lengths = [4, 10, 24]
+domains = ["example{}.com".format(i) for i in range(100)]
+
+
+def bench(generate, length, algorithm, repeat=5):
+    """Return the best time per call (in microseconds) of generate."""
+    def run():
+        for domain in domains:
+            generate("master password", domain, length, algorithm)
+    best = min(timeit.repeat(run, number=10, repeat=repeat))
+    return best / (10 * len(domains)) * 1e6
+
+
+def main():
+    print("{:8} {:>6} {:>12} {:>12} {:>8} {:>12} {:>8}"
+          .format("algo", "length", "reference", "generate", "speedup",
+                  "Generator", "speedup"))
+    for algorithm in algorithms:
+        for length in lengths:
+            for domain in domains:
+                assert (supergenpass.generate("master password", domain,
+                                              length, algorithm) ==
+                        reference.generate("master password", domain,
+                                           length, algorithm))
+            ref = bench(reference.generate, length, algorithm)
+            new = bench(supergenpass.generate, length, algorithm)
+            generator = supergenpass.Generator("master password",
+                                               algorithm=algorithm)
+            gen = bench(lambda master, domain, length, algorithm:
+                        generator.password(domain, length), length, algorithm)
+            print("{:8} {:6d} {:10.2f}us {:10.2f}us {:7.2f}x {:10.2f}us "
+                  "{:7.2f}x".format(algorithm, length, ref, new, ref / new,
+                                    gen, ref / gen))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# SuperGenPass regression checks
+# Copyright (C) 2012-2013  Vianney le Clément de Saint-Marcq <vleclement@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Check the behaviours that once regressed, through the module and the
+command-line interface.
+
+The command-line interface runs in a new session (so that the master
+password is read from the standard input), with an empty configuration
+directory, profile database and no agent. Run from the root of the source
+tree:
+
+    python benchmarks/check_regressions.py [NAME...]
+
+The check fails (exit status 1) if any of the named checks (default: all)
+fails.
+
+"""
+
+import os
+import os.path
+import sys
+import subprocess
+import tempfile
+import threading
+import time
+import traceback
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, root)
+
+import supergenpass
+
+
+master = "master password"
+
+# Checks: name -> function
+checks = {}
+
+
+def check(function):
+    """Register the decorated function as a check."""
+    checks[function.__name__] = function
+    return function
+
+
+def cli(args, stdin='', home=None):
+    """Run the command-line interface with args, in home (default: a new
+    temporary directory), and return the completed process."""
+    if home is None:
+        with tempfile.TemporaryDirectory() as home:
+            return cli(args, stdin, home)
+    env = dict(os.environ, HOME=home, PYTHONPATH=root,
+               XDG_CONFIG_HOME=os.path.join(home, 'config'),
+               XDG_DATA_HOME=os.path.join(home, 'data'),
+               SUPERGENPASS_AGENT_SOCK=os.path.join(home, 'nonexistent'))
+    return subprocess.run([sys.executable, '-m', 'supergenpass'] + args,
+                          input=stdin, env=env, cwd=root,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True, start_new_session=True)
+
+
+def expect(condition, message, *args):
+    if not condition:
+        raise AssertionError(message.format(*args))
+
+
+@check
+def batch_bad_url():
+    """A malformed URL in batch mode is a per-line error."""
+    with tempfile.TemporaryDirectory() as home:
+        path = os.path.join(home, 'batch.txt')
+        with open(path, 'w') as f:
+            f.write("a.com\nhttp://[x\nb.org\n")
+        process = cli(['-b', path], master + "\n", home)
+    expect(process.returncode == 0, "exit status {}: {}",
+           process.returncode, process.stderr)
+    expect(process.stdout.splitlines() == [
+        "a.com\ta.com\t" + supergenpass.generate(master, "a.com"),
+        "http://[x\t\t",
+        "b.org\tb.org\t" + supergenpass.generate(master, "b.org")],
+        "unexpected output {!r}", process.stdout)
+
+
+@check
+def strip_domains_bad_url():
+    """strip_domains yields None for a malformed URL and goes on."""
+    result = list(supergenpass.strip_domains(["a.com", "http://[x",
+                                              "www.b.org"]))
+    expect(result == ["a.com", None, "b.org"], "got {!r}", result)
+    process = cli(['strip'], "a.com\nhttp://[x\nwww.b.org\n")
+    expect(process.returncode == 0 and process.stdout == "a.com\n\nb.org\n",
+           "exit status {}, output {!r}", process.returncode,
+           process.stdout)
+
+
+@check
+def batch_profiles():
+    """Batch mode applies the profiles, as for a single derivation."""
+    with tempfile.TemporaryDirectory() as home:
+        process = cli(['profile', 'set', 'https://www.example.com/x',
+                       '-l', '8', '-a', 'sha256'], home=home)
+        expect(process.returncode == 0, "profile set: {}", process.stderr)
+        single = cli(['example.com'], master + "\n", home)
+        expect(single.stdout == supergenpass.generate(
+            master, "example.com", length=8, algorithm='sha256') + "\n",
+            "unexpected single output {!r}", single.stdout)
+        path = os.path.join(home, 'batch.txt')
+        with open(path, 'w') as f:
+            f.write("a.com\nhttps://www.example.com/y\nb.org\n")
+        expected = [
+            "a.com\ta.com\t" + supergenpass.generate(master, "a.com"),
+            "https://www.example.com/y\texample.com\t" +
+            single.stdout.strip(),
+            "b.org\tb.org\t" + supergenpass.generate(master, "b.org")]
+        for jobs in ['1', '2']:
+            process = cli(['-b', path, '-j', jobs], master + "\n", home)
+            expect(process.stdout.splitlines() == expected,
+                   "unexpected output with {} jobs {!r}: {}", jobs,
+                   process.stdout, process.stderr)
+        # options given on the command line take precedence
+        process = cli(['-b', path, '-l', '12'], master + "\n", home)
+        expect(process.stdout.splitlines()[1].endswith(
+            supergenpass.generate(master, "example.com", length=12,
+                                  algorithm='sha256')),
+            "unexpected output with -l 12 {!r}", process.stdout)
+
+
+@check
+def rotate_profiles():
+    """rotate applies the profiles to the old and new passwords, and reports
+    malformed URLs as lines without passwords."""
+    with tempfile.TemporaryDirectory() as home:
+        process = cli(['profile', 'set', 'example.com', '-l', '8', '-a',
+                       'sha256'], home=home)
+        expect(process.returncode == 0, "profile set: {}", process.stderr)
+        process = cli(['rotate', '-j', '2', '--new-salt', 'x'],
+                      master + "\nnew\nnew\n" +
+                      "www.example.com\nhttp://[x\nb.org\n", home)
+    expect(process.returncode == 0, "exit status {}: {}",
+           process.returncode, process.stderr)
+    expected = [
+        "www.example.com\texample.com\t{}\t{}".format(
+            supergenpass.generate(master, "example.com", 8, 'sha256'),
+            supergenpass.generate("new", "example.com", 8, 'sha256', 'x')),
+        "http://[x\t\t\t",
+        "b.org\tb.org\t{}\t{}".format(
+            supergenpass.generate(master, "b.org"),
+            supergenpass.generate("new", "b.org", salt='x'))]
+    expect(process.stdout.splitlines() == expected,
+           "unexpected output {!r}", process.stdout)
+
+
+@check
+def agent_kdf_concurrency():
+    """A slow key-stretching derivation in the agent does not hold the other
+    clients, and its generator is not kept."""
+    from supergenpass import agent
+    slow = 'pbkdf2-sha256:2000000'
+    with tempfile.TemporaryDirectory() as home:
+        os.chmod(home, 0o700)
+        path = os.path.join(home, 'agent.sock')
+        server = agent.Agent(master, timeout=60)
+        thread = threading.Thread(target=server.run, args=(path,))
+        thread.start()
+        try:
+            while not os.path.exists(path):
+                time.sleep(0.01)
+            results = {}
+
+            def derive():
+                with agent.Client(path, timeout=60) as client:
+                    start = time.perf_counter()
+                    results['slow'] = client.generate("a.com", 10, slow)
+                    results['slow time'] = time.perf_counter() - start
+            client_thread = threading.Thread(target=derive)
+            client_thread.start()
+            time.sleep(0.05)
+            with agent.Client(path) as client:
+                start = time.perf_counter()
+                results['fast'] = client.generate("a.com")
+                results['fast time'] = time.perf_counter() - start
+            client_thread.join()
+        finally:
+            with agent.Client(path) as client:
+                client.stop()
+            thread.join()
+    expect(results['fast'] == supergenpass.generate(master, "a.com"),
+           "wrong password {!r}", results['fast'])
+    expect(results['slow'] == supergenpass.generate(master, "a.com", 10,
+                                                    slow),
+           "wrong password {!r}", results['slow'])
+    expect(results['fast time'] < results['slow time'] / 4,
+           "fast request took {:.3f}s during a {:.3f}s derivation",
+           results['fast time'], results['slow time'])
+    expect(slow not in server._generators, "kept {}", slow)
+
+
+@check
+def calibrate_write_in_place():
+    """calibrate --write updates the algorithm in place, keeping the
+    comments and the order of the configuration file."""
+    config = ("# my settings\n"
+              "[supergenpass]\n"
+              "; short passwords\n"
+              "length = 12\n"
+              "algorithm = sha256\n"
+              "salt = pepper\n"
+              "\n"
+              "[other]\n"
+              "algorithm = keep\n")
+    with tempfile.TemporaryDirectory() as home:
+        os.mkdir(os.path.join(home, 'config'))
+        path = os.path.join(home, 'config', 'supergenpass.ini')
+        with open(path, 'w') as f:
+            f.write(config)
+        process = cli(['calibrate', '1', '--write'], home=home)
+        with open(path) as f:
+            written = f.read()
+    expect(process.returncode == 0, "exit status {}: {}",
+           process.returncode, process.stderr)
+    algorithm = process.stdout.strip()
+    expect(written == config.replace("sha256", algorithm),
+           "unexpected configuration {!r}", written)
+
+
+def main():
+    names = sys.argv[1:] or list(checks)
+    status = 0
+    for name in names:
+        if name not in checks:
+            print("unknown check:", name, file=sys.stderr)
+            sys.exit(2)
+        try:
+            checks[name]()
+        except Exception:
+            print("FAIL:", name, file=sys.stderr)
+            traceback.print_exc()
+            status = 1
+        else:
+            print("ok:", name)
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
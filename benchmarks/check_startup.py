@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# SuperGenPass startup time budget
+# Copyright (C) 2012-2013  Vianney le Clément de Saint-Marcq <vleclement@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Check that the startup of supergenpass stays within budget.
+
+Two things are measured, each several times (the median is kept):
+
+* the cumulative time of "import supergenpass", as reported by
+  python -X importtime;
+* the wall-clock time of a single derivation through the command-line
+  interface (fast path), minus the startup time of a bare interpreter.
+
+The check fails (exit status 1) if a median exceeds its budget, or if a
+module that should be imported lazily shows up. Run from the root of the
+source tree:
+
+    python benchmarks/check_startup.py [--import-budget US] [--cli-budget MS]
+
+The budgets may also be set with the SUPERGENPASS_IMPORT_BUDGET (in
+microseconds) and SUPERGENPASS_CLI_BUDGET (in milliseconds) environment
+variables.
+
+"""
+
+import os
+import os.path
+import sys
+import argparse
+import statistics
+import subprocess
+import tempfile
+import time
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+# Modules that must not be imported by "import supergenpass"
+lazy_import = ['argparse', 'base64', 'hmac', 'itertools', 'json', 're',
+               'urllib.parse']
+# Modules that must not be imported by a single derivation (runpy and
+# configparser already need itertools and re)
+lazy_cli = ['argparse', 'urllib.parse']
+
+
+def python(args, **kwargs):
+    """Run the interpreter from the source tree, with an empty home directory
+    and no agent, and return the completed process."""
+    env = dict(os.environ, HOME=kwargs.pop('home'), PYTHONPATH=root,
+               SUPERGENPASS_AGENT_SOCK=os.path.join(root, 'nonexistent'))
+    return subprocess.run([sys.executable] + args, env=env, cwd=root,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True, start_new_session=True,
+                          **kwargs)
+
+
+def importtime(stderr):
+    """Parse the output of -X importtime into a {module: cumulative us}
+    dict."""
+    modules = {}
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and not line.endswith("package"):
+            _, cumulative, name = line[12:].split('|')
+            modules[name.strip()] = int(cumulative)
+    return modules
+
+
+def measure_import(home):
+    result = python(['-X', 'importtime', '-c', 'import supergenpass'],
+                    home=home)
+    result.check_returncode()
+    modules = importtime(result.stderr)
+    return modules['supergenpass'], modules
+
+
+def measure_cli(home, options=[]):
+    start = time.perf_counter()
+    result = python(options + ['-m', 'supergenpass', 'www.example.com'],
+                    input="master\n", home=home)
+    elapsed = time.perf_counter() - start
+    result.check_returncode()
+    return elapsed, importtime(result.stderr)
+
+
+def measure_bare(home):
+    start = time.perf_counter()
+    python(['-c', 'pass'], home=home).check_returncode()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.description = "Check the startup time of supergenpass."
+    parser.add_argument("--import-budget", type=int, metavar="US",
+                        default=int(os.environ.get(
+                            'SUPERGENPASS_IMPORT_BUDGET', 20000)),
+                        help="budget for importing the package, in "
+                             "microseconds (default: %(default)s)")
+    parser.add_argument("--cli-budget", type=float, metavar="MS",
+                        default=float(os.environ.get(
+                            'SUPERGENPASS_CLI_BUDGET', 80)),
+                        help="budget for a single derivation on top of the "
+                             "interpreter startup, in milliseconds (default: "
+                             "%(default)s)")
+    parser.add_argument("-r", "--repeat", type=int, default=7,
+                        help="number of runs (default: %(default)s)")
+    args = parser.parse_args()
+
+    status = 0
+    with tempfile.TemporaryDirectory() as home:
+        # warm up the caches and the bytecode
+        measure_import(home)
+        measure_cli(home)
+
+        runs = [measure_import(home) for _ in range(args.repeat)]
+        median = statistics.median(us for us, _ in runs)
+        print("import supergenpass: {:.0f}us (budget {}us)"
+              .format(median, args.import_budget))
+        if median > args.import_budget:
+            print("FAIL: import time over budget", file=sys.stderr)
+            status = 1
+        for module in lazy_import:
+            if module in runs[0][1]:
+                print("FAIL: import supergenpass imports {}".format(module),
+                      file=sys.stderr)
+                status = 1
+
+        bare = statistics.median(measure_bare(home)
+                                 for _ in range(args.repeat))
+        median = (statistics.median(measure_cli(home)[0]
+                                    for _ in range(args.repeat)) - bare) * 1e3
+        print("single derivation: {:.1f}ms over interpreter startup "
+              "(budget {}ms)".format(median, args.cli_budget))
+        if median > args.cli_budget:
+            print("FAIL: command-line startup over budget", file=sys.stderr)
+            status = 1
+        _, modules = measure_cli(home, ['-X', 'importtime'])
+        for module in lazy_cli:
+            if module in modules:
+                print("FAIL: single derivation imports {}".format(module),
+                      file=sys.stderr)
+                status = 1
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
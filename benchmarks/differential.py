@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+# SuperGenPass differential testing
+# Copyright (C) 2012-2013  Vianney le Clément de Saint-Marcq <vleclement@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Check that an engine derives exactly what the reference functions do.
+
+An engine is a module providing some of generate, generate_pin, hotp,
+strip_domain and _bad_pin with the signatures of the reference module (by
+default, the supergenpass package itself). Extra entry points of the
+package (Generator, generate_lengths, hotp_many, strip_domains and the PIN
+bitmaps) are checked too when the engine has them. Run from the root of
+the source tree:
+
+    python benchmarks/differential.py check [FILE] [-e ENGINE]
+    python benchmarks/differential.py fuzz [-n CASES] [-j JOBS] [-e ENGINE]
+    python benchmarks/differential.py corpus [-o FILE]
+
+check compares the engine with the golden vectors of golden.json.gz, which
+corpus generates from the reference functions (vectors of algorithms not
+available in the local hashlib are skipped). fuzz compares the engine with
+the reference on random inputs, over a pool of processes. Both exit with
+status 1 on the first mismatches.
+
+strip_domain deliberately differs from the reference below lkd.co.im and
+plc.co.im, the only public suffixes of three labels: such hosts are left
+out. Passwords of key-stretching algorithms, which the reference does not
+know, are frozen from the package in the corpus. Regenerate the corpus when
+the public suffix list is updated.
+
+"""
+
+import os.path
+import sys
+import argparse
+import concurrent.futures
+import gzip
+import hashlib
+import importlib
+import json
+import random
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import reference
+
+
+default_corpus = os.path.join(os.path.dirname(__file__), 'golden.json.gz')
+
+# Hash algorithms of the corpus: those of the local hashlib, but the SHAKE
+# ones, whose digests have no fixed length
+algorithms = sorted(algorithm for algorithm in hashlib.algorithms_available
+                    if not algorithm.startswith('shake_'))
+algorithms += ['MD5', 'SHA256']
+kdf_algorithms = ['pbkdf2-sha256:1000', 'pbkdf2-sha512:500',
+                  'scrypt:1024:8:1']
+lengths = range(4, 25)
+pin_lengths = range(3, 9)
+
+# Characters of the random master passwords, by kind
+_alphabets = ['abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789',
+              ' !"#$%&\'()*+,-./:;<=>?@[\\]^_`{|}~',
+              'éèàçüößñøåÉÀ',
+              '€£¥©®°±§¶',
+              'пароль密码パスワード비밀번호كلمة',
+              '\u0301\u0308\u200d\ufeff',  # combining and invisible
+              '😀🔑🦄👍🏽']
+_labels = ['www', 'mail', 'login', 'm', 'en', 'a', 'shop', 'my-site', 'x1',
+           'example', 'google', 'bücher', 'пример', '例え', 'xn--bcher-kva',
+           'Foo', 'WWW', '127', '0', '']
+_suffixes = ['com', 'org', 'de', 'fr', 'be', 'co.uk', 'ac.uk', 'com.au',
+             'co.jp', 'gov.br', 'k12.ca.us', 'blogspot.com', 'github.io',
+             'co.im', 'рф', 'in', 'x']
+_prefixes = ['', '', '', 'http://', 'https://', 'HTTPS://', 'ftp://',
+             'http://user:pw@', '//', 'mailto:', 'x:/', ' ', 'a b']
+_tails = ['', '', '', '/', '/path?q=1#f', ':8080', ':8080/x', '?x', '#y',
+          ':', ';p', ' ']
+
+
+def random_master(rng):
+    """Return a random master password, with non-ASCII characters now and
+    then."""
+    kinds = _alphabets[:rng.choice([1, 2, 2, 3, len(_alphabets)])]
+    return ''.join(rng.choice(rng.choice(kinds))
+                   for _ in range(rng.randint(0, 24)))
+
+
+def random_domain(rng):
+    """Return a random (stripped-looking) domain name."""
+    labels = [rng.choice(_labels[:-3]) for _ in range(rng.randint(0, 2))]
+    return '.'.join(labels + [rng.choice(_suffixes)])
+
+
+def random_url(rng):
+    """Return a random domain name or URL, as a user could enter it."""
+    if rng.random() < 0.1:
+        host = "{}.{}.{}.{}".format(*(rng.randrange(300) for _ in range(4)))
+    else:
+        labels = [rng.choice(_labels) for _ in range(rng.randint(0, 4))]
+        host = '.'.join(labels + rng.choice(_suffixes).split('.')[
+            rng.choice([0, 0, 0, 1]):])
+    return rng.choice(_prefixes) + host + rng.choice(_tails)
+
+
+def deliberate(url):
+    """Return True if strip_domain deliberately differs from the reference
+    for url."""
+    url = url.lower()
+    return '.lkd.co.im' in url or '.plc.co.im' in url
+
+
+def available(algorithm):
+    """Return True if the local hashlib provides algorithm."""
+    if algorithm.startswith('scrypt:'):
+        return hasattr(hashlib, 'scrypt')
+    if algorithm.startswith('pbkdf2-'):
+        algorithm = algorithm[len('pbkdf2-'):].split(':')[0]
+    try:
+        hashlib.new(algorithm)
+    except ValueError:
+        return False
+    return True
+
+
+def outcome(func, *args):
+    """Return the result of func(*args), or the name of the exception it
+    raised."""
+    try:
+        return func(*args)
+    except Exception as e:
+        return 'error: ' + type(e).__name__
+
+
+# Corpus
+
+def make_corpus(seed, pairs, pin_pairs):
+    """Return the golden vectors, from the reference functions."""
+    rng = random.Random(seed)
+    corpus = {'seed': seed, 'passwords': [], 'salted': [], 'kdf': [],
+              'pins': [], 'bad_pins': [], 'hotp': [], 'strip': []}
+    for algorithm in algorithms:
+        for _ in range(pairs):
+            master, domain = random_master(rng), random_domain(rng)
+            corpus['passwords'].append(
+                [master, domain, algorithm,
+                 [reference.generate(master, domain, length, algorithm)
+                  for length in lengths]])
+    for _ in range(pairs * 4):
+        master, salt, domain = (random_master(rng), random_master(rng),
+                                random_domain(rng))
+        algorithm, length = rng.choice(algorithms), rng.choice(lengths)
+        corpus['salted'].append([master, salt, domain, algorithm, length,
+                                 reference.generate(master + salt, domain,
+                                                    length, algorithm)])
+    import supergenpass
+    for algorithm in kdf_algorithms:
+        for _ in range(pairs // 2):
+            master, domain = random_master(rng), random_domain(rng)
+            corpus['kdf'].append(
+                [master, domain, algorithm,
+                 supergenpass.generate_lengths(master, domain, lengths,
+                                               algorithm)])
+    # Random pairs, then pairs needing retries for some length
+    while len(corpus['pins']) < pin_pairs:
+        master, domain = random_master(rng), random_domain(rng)
+        pins = [reference.generate_pin(master, domain, length)
+                for length in pin_lengths]
+        needs_retry = any(reference._bad_pin(reference.hotp(
+            master.encode('utf-8'), domain.encode('utf-8'), length))
+            for length in pin_lengths)
+        if len(corpus['pins']) < pin_pairs // 2 or needs_retry:
+            corpus['pins'].append([master, domain, pins])
+    for length in pin_lengths:
+        if length <= 4:
+            pins = range(10 ** length)
+        else:
+            pins = (rng.randrange(10 ** length) for _ in range(2000))
+        for pin in pins:
+            pin = "{:0{}d}".format(pin, length)
+            corpus['bad_pins'].append([pin, reference._bad_pin(pin)])
+    for pin in sorted(reference._pin_blacklist):
+        corpus['bad_pins'].append([pin, reference._bad_pin(pin)])
+    # RFC 4226, appendix D
+    key = b"12345678901234567890"
+    for counter in range(10):
+        counter = counter.to_bytes(8, byteorder='big')
+        corpus['hotp'].append([key.hex(), counter.hex(), 6,
+                               reference.hotp(key, counter, 6)])
+    for _ in range(pin_pairs):
+        key = rng.randbytes(rng.choice([0, 1, 16, 20, 32, 64, 65, 100]))
+        counter = rng.randbytes(rng.choice([0, 8, 8, 8, 16]))
+        length = rng.randint(1, 9)
+        corpus['hotp'].append([key.hex(), counter.hex(), length,
+                               reference.hotp(key, counter, length)])
+    while len(corpus['strip']) < pairs * 50:
+        url = random_url(rng)
+        if not deliberate(url):
+            corpus['strip'].append([url, outcome(reference.strip_domain,
+                                                 url)])
+    return corpus
+
+
+def command_corpus(args):
+    corpus = make_corpus(args.seed, args.pairs, args.pin_pairs)
+    data = json.dumps(corpus, ensure_ascii=False, separators=(',', ':'),
+                      sort_keys=True).encode('utf-8')
+    # mtime=0 so that the same corpus gives the same file
+    with open(args.output, 'wb') as raw:
+        with gzip.GzipFile('', 'wb', 9, raw, mtime=0) as f:
+            f.write(data)
+    print("{}: {} password chains, {} salted, {} key-stretched, {} PIN "
+          "pairs, {} PINs checked, {} HOTPs, {} URLs".format(
+              args.output, len(corpus['passwords']), len(corpus['salted']),
+              len(corpus['kdf']), len(corpus['pins']),
+              len(corpus['bad_pins']), len(corpus['hotp']),
+              len(corpus['strip'])), file=sys.stderr)
+
+
+# Checks
+
+# Result of the vectors of algorithms not available locally
+skipped = object()
+
+
+def check_corpus(engine, corpus):
+    """Yield (kind, arguments, expected, result) for every vector of corpus
+    the engine can derive; result is skipped for the vectors of algorithms
+    not available locally."""
+    generate_lengths = getattr(engine, 'generate_lengths', None)
+    generator = getattr(engine, 'Generator', None)
+    if hasattr(engine, 'generate'):
+        for kind in 'passwords', 'kdf':
+            if kind == 'kdf' and generate_lengths is None:
+                continue  # not an engine of the package
+            for master, domain, algorithm, passwords in corpus[kind]:
+                if not available(algorithm):
+                    yield kind, (master, domain, algorithm), passwords, \
+                        skipped
+                    continue
+                results = [outcome(engine.generate, master, domain, length,
+                                   algorithm) for length in lengths]
+                yield kind, (master, domain, algorithm), passwords, results
+                if generate_lengths is not None:
+                    yield (kind + '/generate_lengths',
+                           (master, domain, algorithm), passwords,
+                           outcome(generate_lengths, master, domain, lengths,
+                                   algorithm))
+        for master, salt, domain, algorithm, length, password in \
+                corpus['salted']:
+            args = master, salt, domain, algorithm, length
+            if not available(algorithm):
+                yield 'salted', args, password, skipped
+                continue
+            yield 'salted', args, password, outcome(
+                engine.generate, master + salt, domain, length, algorithm)
+            if generator is not None:
+                yield 'salted/Generator', args, password, outcome(
+                    lambda: generator(master.encode('utf-8'), salt,
+                                      algorithm).password(domain, length))
+    if hasattr(engine, 'generate_pin'):
+        for master, domain, pins in corpus['pins']:
+            yield 'pins', (master, domain), pins, [
+                outcome(engine.generate_pin, master, domain, length)
+                for length in pin_lengths]
+    if hasattr(engine, '_bad_pin'):
+        for pin, bad in corpus['bad_pins']:
+            yield 'bad_pins', (pin,), bad, outcome(engine._bad_pin, pin)
+            if hasattr(engine, '_bad_pin_test'):
+                yield 'bad_pins/bitmap', (pin,), bad, outcome(
+                    lambda: engine._bad_pin_test(len(pin))(int(pin)))
+    if hasattr(engine, 'hotp'):
+        for key, counter, length, value in corpus['hotp']:
+            key, counter = bytes.fromhex(key), bytes.fromhex(counter)
+            yield 'hotp', (key, counter, length), value, outcome(
+                engine.hotp, key, counter, length)
+            if hasattr(engine, 'hotp_many'):
+                yield 'hotp/hotp_many', (key, counter, length), [value], \
+                    outcome(engine.hotp_many, key, [counter], length)
+    if hasattr(engine, 'strip_domain'):
+        for url, stripped in corpus['strip']:
+            yield 'strip', (url,), stripped, outcome(engine.strip_domain, url)
+        if hasattr(engine, 'strip_domains'):
+            urls = [url for url, _ in corpus['strip']]
+            yield 'strip/strip_domains', ("{} URLs".format(len(urls)),), \
+                [stripped for _, stripped in corpus['strip']], \
+                outcome(lambda: list(engine.strip_domains(urls)))
+
+
+def report_mismatch(kind, args, expected, result):
+    print("MISMATCH {}{!r}: expected {!r}, got {!r}".format(
+        kind, args, expected, result), file=sys.stderr)
+
+
+def command_check(args):
+    engine = importlib.import_module(args.engine)
+    with gzip.open(args.corpus, 'rt', encoding='utf-8') as f:
+        corpus = json.load(f)
+    counts = {}
+    failures = 0
+    for kind, arguments, expected, result in check_corpus(engine, corpus):
+        checked, skips, failed = counts.get(kind, (0, 0, 0))
+        if result is skipped:
+            skips += 1
+        elif result == expected:
+            checked += 1
+        else:
+            failed += 1
+            failures += 1
+            if failures <= args.max_failures:
+                report_mismatch(kind, arguments, expected, result)
+        counts[kind] = checked, skips, failed
+    for kind, (checked, skips, failed) in counts.items():
+        print("{:26} {:7} ok {:5} skipped {:5} failed".format(
+            kind, checked, skips, failed))
+    sys.exit(1 if failures else 0)
+
+
+# Fuzzing
+
+def _fuzz(engine_name, seed, count, max_failures):
+    """Compare the engine with the reference on count random cases. Return
+    the number of cases by kind and the first mismatches."""
+    engine = importlib.import_module(engine_name)
+    rng = random.Random(seed)
+    kinds = [kind for kind, function in [
+        ('password', 'generate'), ('lengths', 'generate_lengths'),
+        ('pin', 'generate_pin'), ('bad_pin', '_bad_pin'),
+        ('hotp', 'hotp'), ('strip', 'strip_domain')]
+        if hasattr(engine, function)]
+    counts = dict.fromkeys(kinds, 0)
+    failures = []
+    for _ in range(count):
+        kind = rng.choice(kinds)
+        if kind == 'password':
+            args = (random_master(rng), random_domain(rng),
+                    rng.choice(lengths), rng.choice(algorithms))
+            expected = outcome(reference.generate, *args)
+            result = outcome(engine.generate, *args)
+        elif kind == 'lengths':
+            master, domain = random_master(rng), random_domain(rng)
+            algorithm = rng.choice(algorithms)
+            some = rng.sample(lengths, rng.randint(1, 5))
+            args = master, domain, some, algorithm
+            expected = [outcome(reference.generate, master, domain, length,
+                                algorithm) for length in some]
+            result = outcome(engine.generate_lengths, *args)
+        elif kind == 'pin':
+            args = (random_master(rng), random_domain(rng),
+                    rng.choice(pin_lengths))
+            expected = outcome(reference.generate_pin, *args)
+            result = outcome(engine.generate_pin, *args)
+        elif kind == 'bad_pin':
+            length = rng.choice(pin_lengths)
+            args = "{:0{}d}".format(rng.randrange(10 ** length), length),
+            expected = outcome(reference._bad_pin, *args)
+            result = outcome(engine._bad_pin, *args)
+        elif kind == 'hotp':
+            args = (rng.randbytes(rng.randint(0, 100)),
+                    rng.randbytes(rng.choice([0, 8, 8, 20])),
+                    rng.randint(1, 9))
+            expected = outcome(reference.hotp, *args)
+            result = outcome(engine.hotp, *args)
+        else:
+            args = random_url(rng),
+            if deliberate(args[0]):
+                continue
+            expected = outcome(reference.strip_domain, *args)
+            result = outcome(engine.strip_domain, *args)
+        counts[kind] += 1
+        if result != expected and len(failures) < max_failures:
+            failures.append((kind, args, expected, result))
+    return counts, failures
+
+
+def command_fuzz(args):
+    workers = args.jobs or os.cpu_count() or 1
+    seed = random.randrange(1 << 32) if args.seed is None else args.seed
+    chunk = max(1, min(20000, -(-args.cases // (workers * 4))))
+    chunks = [("{}-{}".format(seed, start), min(chunk, args.cases - start))
+              for start in range(0, args.cases, chunk)]
+    counts = {}
+    failures = []
+    start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(_fuzz, args.engine, chunk_seed, count,
+                                   args.max_failures)
+                   for chunk_seed, count in chunks]
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                chunk_counts, chunk_failures = future.result()
+                for kind, count in chunk_counts.items():
+                    counts[kind] = counts.get(kind, 0) + count
+                failures.extend(chunk_failures)
+                if len(failures) >= args.max_failures:
+                    break
+        finally:
+            for future in futures:
+                future.cancel()
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    print("{} cases in {:.1f}s ({:.0f} cases/min), seed {}: {}".format(
+        total, elapsed, total / elapsed * 60, seed,
+        ", ".join("{} {}".format(count, kind)
+                  for kind, count in sorted(counts.items()))))
+    for failure in failures[:args.max_failures]:
+        report_mismatch(*failure)
+    sys.exit(1 if failures else 0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.description = "Compare a supergenpass engine with the reference " \
+                         "functions."
+    commands = parser.add_subparsers(dest='command', metavar="COMMAND")
+    commands.required = True
+    check = commands.add_parser("check", help="check the golden vectors")
+    check.add_argument("corpus", nargs='?', default=default_corpus,
+                       help="corpus file (default: %(default)s)")
+    fuzz = commands.add_parser("fuzz", help="compare on random inputs")
+    fuzz.add_argument("-n", "--cases", type=int, default=1000000,
+                      help="number of random cases (default: %(default)s)")
+    fuzz.add_argument("-j", "--jobs", type=int,
+                      help="number of processes (default: number of CPUs)")
+    fuzz.add_argument("--seed", type=int,
+                      help="seed of the random cases, to reproduce a run")
+    for command in check, fuzz:
+        command.add_argument("-e", "--engine", default='supergenpass',
+                             help="module to check (default: %(default)s)")
+        command.add_argument("--max-failures", type=int, default=10,
+                             help="number of mismatches reported (default: "
+                                  "%(default)s)")
+    check.set_defaults(func=command_check)
+    fuzz.set_defaults(func=command_fuzz)
+    corpus = commands.add_parser("corpus", help="generate the golden vectors")
+    corpus.add_argument("-o", "--output", default=default_corpus,
+                        help="corpus file (default: %(default)s)")
+    corpus.add_argument("--seed", type=int, default=4226,
+                        help="seed of the random inputs (default: "
+                             "%(default)s)")
+    corpus.add_argument("--pairs", type=int, default=60,
+                        help="number of random (master, domain) pairs per "
+                             "algorithm (default: %(default)s)")
+    corpus.add_argument("--pin-pairs", type=int, default=1000,
+                        help="number of (master, domain) pairs for PINs and "
+                             "of random HOTPs (default: %(default)s)")
+    corpus.set_defaults(func=command_corpus)
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# SuperGenPass benchmark suite
+# Copyright (C) 2012-2013  Vianney le Clément de Saint-Marcq <vleclement@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmark every public entry point of supergenpass.
+
+Each benchmark is timed with timeit: the number of calls per run is chosen
+so that a run lasts at least 0.2 seconds, the run is repeated and the
+median time per call is kept. Results are written as JSON and two result
+files can be compared. Run from the root of the source tree:
+
+    python benchmarks/suite.py run [-o FILE] [-k PATTERN] [-r REPEAT]
+    python benchmarks/suite.py compare OLD NEW [-t PERCENT]
+
+compare exits with status 1 if a benchmark is slower in NEW than in OLD by
+more than the threshold.
+
+"""
+
+import os.path
+import sys
+import argparse
+import fnmatch
+import json
+import platform
+import random
+import statistics
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import supergenpass
+import check_startup
+
+
+master = "master password"
+algorithms = ['md5', 'sha1', 'sha256', 'sha512']
+lengths = [4, 8, 10, 16, 24]
+pin_lengths = range(3, 9)
+domains = ["example{}.com".format(i) for i in range(100)]
+
+
+def _retries(generator, domain, length):
+    """Return the number of bad PINs rejected by generator.pin."""
+    return generator._pin(domain.encode('utf-8'), length)[1]
+
+
+def retry_domains(length, count=20):
+    """Return the count domains needing the most retries to find a good PIN
+    of given length, among a few thousand candidates."""
+    generator = supergenpass.Generator(master)
+    candidates = ["retry{}.com".format(i) for i in range(5000)]
+    candidates.sort(key=lambda domain: -_retries(generator, domain, length))
+    return candidates[:count]
+
+
+def url_corpus(count=1000, seed=42):
+    """Return a list of realistic URLs and host names."""
+    rng = random.Random(seed)
+    names = ['google', 'wikipedia', 'github', 'bbc', 'amazon', 'example',
+             'bank-online', 'my-blog', 'xn--bcher-kva', 'mail', 'shop']
+    suffixes = ['com', 'org', 'net', 'de', 'fr', 'be', 'co.uk', 'ac.uk',
+                'com.au', 'co.jp', 'gov.br', 'k12.ca.us', 'blogspot.com',
+                'github.io', 'appspot.com']
+    subdomains = ['', 'www.', 'm.', 'login.', 'en.', 'static.cdn.',
+                  'a.b.c.d.']
+    paths = ['', '/', '/index.html', '/wiki/Main_Page', '/search?q=pass',
+             '/a/b/c?x=1&y=2#top', '/login?next=%2Faccount']
+    corpus = []
+    for _ in range(count):
+        host = (rng.choice(subdomains) + rng.choice(names) + "." +
+                rng.choice(suffixes))
+        kind = rng.random()
+        if kind < 0.2:
+            corpus.append(host)
+        elif kind < 0.25:
+            corpus.append("{}.{}.{}.{}".format(*(rng.randrange(256)
+                                                 for _ in range(4))))
+        elif kind < 0.3:
+            corpus.append("http://user:pw@{}:8080{}"
+                          .format(host, rng.choice(paths)))
+        else:
+            corpus.append("{}://{}{}".format(rng.choice(['http', 'https']),
+                                              host, rng.choice(paths)))
+    return corpus
+
+
+# Benchmarks: name -> (function, number of operations per call)
+benchmarks = {}
+
+
+def benchmark(name, ops=1):
+    """Register the decorated function as benchmark name."""
+    def decorate(func):
+        benchmarks[name] = (func, ops)
+        return func
+    return decorate
+
+
+def _register():
+    for algorithm in algorithms:
+        for length in lengths:
+            def run(algorithm=algorithm, length=length):
+                for domain in domains:
+                    supergenpass.generate(master, domain, length, algorithm)
+            benchmark("generate/{}/{}".format(algorithm, length),
+                      len(domains))(run)
+    def run():
+        supergenpass.enable_cache(maxsize=len(domains))
+        try:
+            for domain in domains * 10:
+                supergenpass.generate(master, domain)
+        finally:
+            supergenpass.enable_cache(False)
+    benchmark("generate/md5/10/cached", len(domains) * 10)(run)
+    generator = supergenpass.Generator(master)
+    benchmark("Generator.password/md5/10", len(domains))(
+        lambda: [generator.password(domain) for domain in domains])
+    benchmark("generate_lengths/md5/4-24", len(domains))(
+        lambda: [supergenpass.generate_lengths(master, domain, range(4, 25))
+                 for domain in domains])
+    for length in pin_lengths:
+        def run(length=length):
+            for domain in domains:
+                supergenpass.generate_pin(master, domain, length)
+        benchmark("generate_pin/{}".format(length), len(domains))(run)
+        retry = retry_domains(length)
+        def run(length=length, retry=retry):
+            for domain in retry:
+                supergenpass.generate_pin(master, domain, length)
+        benchmark("generate_pin/{}/retries".format(length), len(retry))(run)
+    counters = [i.to_bytes(8, 'big') for i in range(100)]
+    benchmark("hotp/6", len(counters))(
+        lambda: [supergenpass.hotp(b"12345678901234567890", counter)
+                 for counter in counters])
+    benchmark("hotp_many/6", len(counters))(
+        lambda: supergenpass.hotp_many(b"12345678901234567890", counters))
+    benchmark("hotp_verify/6/window20", 21)(
+        lambda: supergenpass.hotp_verify(b"12345678901234567890", "000000",
+                                         1000, 20))
+    urls = url_corpus()
+    benchmark("strip_domain/urls", len(urls))(
+        lambda: [supergenpass.strip_domain(url) for url in urls])
+    hosts = [url for url in urls if '/' not in url]
+    benchmark("strip_domain/hosts", len(hosts))(
+        lambda: [supergenpass.strip_domain(host) for host in hosts])
+    # hosts starting with a digit go through the IPv4 address check
+    digits = ["{}.{}.{}.{}".format(i, i * 7 % 256, i * 13 % 256, i % 10)
+              for i in range(50)]
+    digits += ["{}password.com".format(i) for i in range(25)]
+    digits += ["{}.example.co.uk".format(i) for i in range(25)]
+    benchmark("strip_domain/digit-hosts", len(digits))(
+        lambda: [supergenpass.strip_domain(host) for host in digits])
+    repeated = urls * 10
+    benchmark("strip_domains/urls", len(repeated))(
+        lambda: list(supergenpass.strip_domains(repeated)))
+
+
+def time_call(func, ops, repeat):
+    """Time func with timeit and return the statistics of the time per
+    operation, in seconds."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    times = [t / number / ops for t in timer.repeat(repeat, number)]
+    return {'median': statistics.median(times), 'min': min(times),
+            'max': max(times), 'repeat': repeat, 'number': number,
+            'ops': ops}
+
+
+def time_startup(repeat):
+    """Time the import of the package and a single derivation through the
+    command-line interface, in seconds."""
+    results = {}
+    with tempfile.TemporaryDirectory() as home:
+        check_startup.measure_import(home)
+        check_startup.measure_cli(home)
+        times = [check_startup.measure_import(home)[0] / 1e6
+                 for _ in range(repeat)]
+        results['startup/import'] = times
+        bare = [check_startup.measure_bare(home) for _ in range(repeat)]
+        results['startup/interpreter'] = bare
+        results['startup/cli'] = [check_startup.measure_cli(home)[0]
+                                  for _ in range(repeat)]
+    return {name: {'median': statistics.median(times), 'min': min(times),
+                   'max': max(times), 'repeat': repeat, 'number': 1,
+                   'ops': 1}
+            for name, times in results.items()}
+
+
+def command_run(args):
+    def selected(name):
+        return not args.pattern or any(fnmatch.fnmatch(name, pattern)
+                                       for pattern in args.pattern)
+    _register()
+    results = {}
+    for name, (func, ops) in benchmarks.items():
+        if not selected(name):
+            continue
+        results[name] = time_call(func, ops, args.repeat)
+        print("{:32} {:12.3f}us".format(name, results[name]['median'] * 1e6),
+              file=sys.stderr)
+    if selected('startup/'):
+        for name, result in time_startup(args.repeat).items():
+            results[name] = result
+            print("{:32} {:12.3f}ms".format(name, result['median'] * 1e3),
+                  file=sys.stderr)
+    output = {'python': platform.python_version(),
+              'implementation': platform.python_implementation(),
+              'machine': platform.machine(),
+              'platform': platform.platform(),
+              'date': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+              'results': results}
+    if args.output == '-':
+        json.dump(output, sys.stdout, indent=2, sort_keys=True)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+
+def command_compare(args):
+    with open(args.old) as f:
+        old = json.load(f)['results']
+    with open(args.new) as f:
+        new = json.load(f)['results']
+    status = 0
+    print("{:32} {:>12} {:>12} {:>8}".format("benchmark", "old", "new",
+                                              "change"))
+    for name in sorted(set(old) & set(new)):
+        before = old[name]['median']
+        after = new[name]['median']
+        change = (after / before - 1) * 100
+        flag = ""
+        if change > args.threshold:
+            flag = "  REGRESSION"
+            status = 1
+        elif change < -args.threshold:
+            flag = "  improvement"
+        print("{:32} {:10.3f}us {:10.3f}us {:+7.1f}%{}"
+              .format(name, before * 1e6, after * 1e6, change, flag))
+    for name in sorted(set(old) ^ set(new)):
+        print("{:32} only in {}".format(name,
+                                        "old" if name in old else "new"))
+    sys.exit(status)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.description = "Run the supergenpass benchmarks or compare " \
+                         "their results."
+    commands = parser.add_subparsers(dest='command', metavar="COMMAND")
+    commands.required = True
+    run = commands.add_parser("run", help="run the benchmarks")
+    run.add_argument("-o", "--output", default='-',
+                     help="file to write the JSON results to (default: "
+                          "standard output)")
+    run.add_argument("-k", "--pattern", action='append',
+                     help="only run the benchmarks matching this shell "
+                          "pattern, e.g. 'generate/*' or 'startup/*' (may be "
+                          "repeated)")
+    run.add_argument("-r", "--repeat", type=int, default=7,
+                     help="number of runs per benchmark (default: "
+                          "%(default)s)")
+    run.set_defaults(func=command_run)
+    compare = commands.add_parser("compare", help="compare two result files")
+    compare.add_argument("old", help="results of the baseline")
+    compare.add_argument("new", help="results to check")
+    compare.add_argument("-t", "--threshold", type=float, default=10,
+                         metavar="PERCENT",
+                         help="slowdown above which a benchmark is "
+                              "reported as a regression (default: "
+                              "%(default)s)")
+    compare.set_defaults(func=command_compare)
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -15,7 +15,34 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import os.path
 from distutils.core import setup
+from distutils.command.build_py import build_py
+
+
+class BuildPy(build_py):
+
+    """Compile the public suffix index, and build the bitmaps of bad PINs
+    of 7 and 8 digits, before building the package."""
+
+    def run(self):
+        from distutils.errors import DistutilsError
+        from supergenpass import _compile_suffixes, pinindex
+        _compile_suffixes()
+        for length in (7, 8):
+            if not os.path.exists(pinindex.filename(length)):
+                self.announce("building {}{}".format(
+                    pinindex.filename(length),
+                    "" if pinindex.numpy is not None else
+                    " without NumPy (this takes a few minutes)"), level=3)
+            try:
+                pinindex.build_missing([length])
+            except ValueError as e:
+                raise DistutilsError(str(e))
+        # the data files were listed before the new ones were written
+        self.data_files = self.get_data_files()
+        build_py.run(self)
+
 
 setup(name="supergenpass",
       version="0.1",
@@ -25,6 +52,7 @@ setup(name="supergenpass",
       url="https://bitbucket.org/vianney/supergenpass",
       license="GPLv3+",
       packages=['supergenpass'],
+      cmdclass={'build_py': BuildPy},
       package_data={'supergenpass': ['data/*']},
       scripts=['scripts/supergenpass'],
       data_files=[('share/pixmaps', ['data/supergenpass.png']),
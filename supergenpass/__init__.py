@@ -22,14 +22,11 @@
 #   Copyright (C) 2010 Steve Pomeroy
 #   http://staticfree.info/projects/sgp/
 
+# Only the modules needed to derive passwords are imported here, to keep the
+# import fast. Other modules are imported where they are used.
 import os.path
-import re
-import itertools
-import json
-import base64
+import binascii
 import hashlib
-import hmac
-import urllib.parse
 
 
 # Directory with data files
@@ -43,35 +40,114 @@ data_dir = os.path.join(os.path.dirname(__file__), 'data')
 # * Always contain at least one uppercase letter of the alphabet
 # * Always contain at least one numeral
 # * Can be any length from 4 to 24 characters (default: 10)
-_valid_pass = \
-    re.compile(r"""^[a-z]                          # start with lowercase
-                   [a-zA-Z0-9]*                    # stuff
-                   (?:(?:[A-Z][a-zA-Z0-9]*[0-9])|  # uppercase stuff number OR
-                   (?:[0-9][a-zA-Z0-9]*[A-Z]))     # number stuff uppercase
-                   [a-zA-Z0-9]*$""",               # stuff
-               re.VERBOSE)
+# _valid_pass is compiled on first access (see __getattr__), as importing re
+# is slow. The password generator checks these rules with _valid_prefix.
+_valid_pass_pattern = \
+    r"""^[a-z]                          # start with lowercase
+        [a-zA-Z0-9]*                    # stuff
+        (?:(?:[A-Z][a-zA-Z0-9]*[0-9])|  # uppercase stuff number OR
+        (?:[0-9][a-zA-Z0-9]*[A-Z]))     # number stuff uppercase
+        [a-zA-Z0-9]*$"""                # stuff
 
 
-def generate(master, domain, length=10, algorithm='md5'):
-    """Derive a SuperGenPass password from a master password and a domain name.
+def __getattr__(name):
+    global _valid_pass
+    if name == '_valid_pass':
+        import re
+        _valid_pass = re.compile(_valid_pass_pattern, re.VERBOSE)
+        return _valid_pass
+    raise AttributeError("module {!r} has no attribute {!r}"
+                         .format(__name__, name))
 
-    The domain name will be used as is. Use strip_domain to preprocess a URL.
 
-    Arguments:
-    master -- the master password
-    domain -- the domain name
-    length -- length of the desired password
-    algorithm -- hash algorithm to use
+# Translation table turning standard base64 into the SuperGenPass alphabet:
+# '+' and '/' become '9' and '8', and the padding '=' becomes 'A'.
+_b64_table = bytes.maketrans(b'+/=', b'98A')
+
+
+def _hash_constructor(algorithm):
+    """Return a callable creating a new hash object for algorithm.
+
+    The named constructors of hashlib are used when available, as they avoid
+    the lookup by name done by hashlib.new at each call.
 
     """
-    password = master + ":" + domain
-    count = 0
-    while count < 10 or not _valid_pass.match(password[:length]):
-        password = hashlib.new(algorithm, password.encode('utf-8')).digest()
-        password = base64.b64encode(password, b'98').decode('ascii')
-        password = password.replace('=', 'A')
-        count += 1
-    return password[:length]
+    if algorithm in hashlib.algorithms_guaranteed:
+        return getattr(hashlib, algorithm)
+    hashlib.new(algorithm)  # raise ValueError early if unsupported
+
+    def new(data=b''):
+        return hashlib.new(algorithm, data)
+    return new
+
+
+def _parse_algorithm(algorithm):
+    """Parse an algorithm name. Return a pair (name of the hash algorithm of
+    the chain, key derivation function of the first round or None).
+
+    Plain hash algorithms (e.g., 'md5') are iterated as in SuperGenPass.
+    Key-stretching algorithms replace the first round with a key derivation
+    function, called with the master password and the domain name as salt:
+
+    pbkdf2-HASH:ITERATIONS -- PBKDF2-HMAC with hash algorithm HASH (e.g.,
+                              'pbkdf2-sha256:100000'), the chain continuing
+                              with HASH
+    scrypt:N:R:P -- scrypt with cost N (a power of two), block size R and
+                    parallelization P (e.g., 'scrypt:16384:8:1'), the chain
+                    continuing with sha256
+
+    """
+    kind, _, params = algorithm.partition(':')
+    if not params:
+        return algorithm, None
+    try:
+        params = [int(param) for param in params.split(':')]
+    except ValueError:
+        raise ValueError("invalid parameters for {}: {}"
+                         .format(kind, algorithm)) from None
+    if kind.startswith('pbkdf2-') and len(params) == 1:
+        name = kind[7:]
+        iterations, = params
+        if iterations < 1:
+            raise ValueError("iterations must be at least 1: {}"
+                             .format(algorithm))
+        try:
+            hashlib.pbkdf2_hmac(name, b'', b'', 1)
+        except ValueError:
+            raise ValueError("unsupported hash type {}".format(name)) from None
+
+        def kdf(master, domain):
+            return hashlib.pbkdf2_hmac(name, master, domain, iterations)
+        return name, kdf
+    elif kind == 'scrypt' and len(params) == 3:
+        n, r, p = params
+        if n < 2 or n & (n - 1) or r < 1 or p < 1:
+            raise ValueError("invalid parameters for scrypt: {}"
+                             .format(algorithm))
+        if not hasattr(hashlib, 'scrypt'):
+            raise ValueError("scrypt is not available")
+        # memory used by scrypt, plus some margin
+        maxmem = 128 * r * (n + p + 2) + (1 << 20)
+
+        def kdf(master, domain):
+            return hashlib.scrypt(master, salt=domain, n=n, r=r, p=p,
+                                  maxmem=maxmem, dklen=32)
+        return 'sha256', kdf
+    raise ValueError("unsupported algorithm: {}".format(algorithm))
+
+
+def _valid_prefix(password, length):
+    """Return True if the first length characters of password (bytes in the
+    SuperGenPass base64 alphabet) form a valid password.
+
+    This is equivalent to matching _valid_pass: since the alphabet only holds
+    alphanumerics, a prefix starting with a lowercase letter contains an
+    uppercase letter iff it is not all lowercase, and a digit iff it is not
+    all letters.
+
+    """
+    prefix = password[:length]
+    return prefix[0] >= 0x61 and not prefix.islower() and not prefix.isalpha()
 
 
 def hotp(key, counter, length=6):
@@ -83,16 +159,110 @@ def hotp(key, counter, length=6):
     length -- number of digits in the output
 
     """
+    import hmac
     # Step 1: HMAC-SHA-1
-    hs = hmac.new(key, counter, digestmod=hashlib.sha1).digest()
+    hs = hmac.digest(key, counter, 'sha1')
+    return ("{:0" + str(length) + "d}").format(_truncate(hs, length))
+
+
+def _counter(counter):
+    """Return counter as bytes: an integer is encoded on 8 bytes, big-endian,
+    as in RFC 4226."""
+    if isinstance(counter, int):
+        return counter.to_bytes(8, byteorder='big')
+    return counter
+
+
+def hotp_many(key, counters, length=6):
+    """Generate the HOTPs of several counters with the same key.
+
+    This is equivalent to calling hotp for each counter, but the HMAC key
+    schedule is done only once. Return a list with the HOTP of each counter,
+    in the same order as counters.
+
+    Arguments:
+    key -- the key (bytes object)
+    counters -- iterable of moving parts (bytes objects, or integers encoded
+                on 8 bytes as in RFC 4226), e.g., a range
+    length -- number of digits in the output
+
+    """
+    pads = _hmac_sha1(key)
+    fmt = "{:0" + str(length) + "d}"
+    return [fmt.format(_truncate(_hmac_digest(pads, _counter(counter)),
+                                 length))
+            for counter in counters]
+
+
+def hotp_verify(key, token, counter, window=10):
+    """Check an HOTP against the counters from counter to counter + window,
+    as in the resynchronization of RFC 4226. Return the counter whose HOTP
+    is token, or None if none of them matches.
+
+    Every HOTP of the window is computed and compared in constant time, so
+    that the time taken does not reveal which counter matched.
+
+    Arguments:
+    key -- the key (bytes object)
+    token -- the HOTP to check (str)
+    counter -- first counter to try (integer)
+    window -- number of counters to look ahead of counter
+
+    """
+    import hmac
+    token = token.encode('ascii')
+    counters = range(counter, counter + window + 1)
+    match = None
+    for candidate, value in zip(counters,
+                                hotp_many(key, counters, len(token))):
+        if hmac.compare_digest(value.encode('ascii'), token) and \
+                match is None:
+            match = candidate
+    return match
+
+
+def _truncate(hs, length):
+    """Return the HOTP value (an integer of at most length digits) from the
+    HMAC-SHA-1 digest hs (steps 2 and 3 of RFC 4226)."""
     # Step 2: Dynamic Truncation
     assert len(hs) == 20
     offset = hs[19] & 0xf
     p = int.from_bytes(hs[offset:offset+4], byteorder='big')
     snum = p & 0x7fffffff
     # Step 3: output
-    d = snum % (10 ** length)
-    return ("{:0" + str(length) + "d}").format(d)
+    return snum % (10 ** length)
+
+
+# Translation tables XOR-ing every byte with the HMAC pads (RFC 2104)
+_hmac_ipad = bytes(x ^ 0x36 for x in range(256))
+_hmac_opad = bytes(x ^ 0x5c for x in range(256))
+
+
+def _hmac_sha1(key):
+    """Return the inner and outer SHA-1 states of HMAC-SHA-1 with key, after
+    the key schedule. The buffers holding the padded key are zeroed."""
+    if len(key) > 64:
+        key = hashlib.sha1(key).digest()
+    pad = bytearray(64)
+    pad[:len(key)] = key
+    inner = pad.translate(_hmac_ipad)
+    outer = pad.translate(_hmac_opad)
+    states = hashlib.sha1(inner), hashlib.sha1(outer)
+    for buffer in pad, inner, outer:
+        buffer[:] = bytes(64)
+    return states
+
+
+def _hmac_digest(states, *parts):
+    """Return the HMAC-SHA-1 digest of the concatenation of parts, from the
+    states returned by _hmac_sha1. This is faster than copying an hmac
+    object, whose copy rebuilds both states in Python."""
+    inner = states[0].copy()
+    for part in parts:
+        inner.update(part)
+    outer = states[1].copy()
+    outer.update(inner.digest())
+    return outer.digest()
 
 
 # Set of blacklisted PINs from Android app
@@ -110,6 +280,7 @@ _pin_blacklist = {"90210",
 # from itertools recipes
 def _pairwise(iterable):
     "s -> (s0,s1), (s1,s2), (s2, s3), ..."
+    import itertools
     a, b = itertools.tee(iterable)
     next(b, None)
     return zip(a, b)
@@ -119,6 +290,7 @@ def _pairwise(iterable):
 def _grouper(n, iterable, fillvalue=None):
     "Collect data into fixed-length chunks or blocks"
     # grouper(3, 'ABCDEFG', 'x') --> ABC DEF Gxx"
+    import itertools
     args = [iter(iterable)] * n
     return itertools.zip_longest(*args, fillvalue=fillvalue)
 
@@ -161,50 +333,662 @@ def _bad_pin(pin):
     return pin in _pin_blacklist
 
 
-def generate_pin(master, domain, length=4):
+# Tests for bad PINs, indexed by PIN length
+_bad_pin_tests = {}
+
+
+def _bad_pin_test(length):
+    """Return a function telling whether a PIN of given length, as an integer,
+    is a bad PIN.
+
+    The test is a single bit lookup in the precomputed bitmap of bad PINs
+    (data/badpinsN.bin, see the pinindex module) if available, and falls back
+    to _bad_pin otherwise.
+
+    """
+    try:
+        return _bad_pin_tests[length]
+    except KeyError:
+        pass
+    import mmap
+    bitmap = None
+    try:
+        with open(os.path.join(data_dir, 'badpins{}.bin'.format(length)),
+                  'rb') as f:
+            bitmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):  # missing or empty file
+        pass
+    if bitmap is not None and len(bitmap) == (10 ** length + 7) // 8:
+        def test(pin):
+            return bitmap[pin >> 3] >> (pin & 7) & 1
+    else:
+        fmt = "{:0" + str(length) + "d}"
+
+        def test(pin):
+            return _bad_pin(fmt.format(pin))
+    _bad_pin_tests[length] = test
+    return test
+
+
+def _buffer(*parts):
+    """Return the concatenation of parts (str, encoded in UTF-8, or bytes-like
+    objects) in a new bytearray, allocated once so that no partial copy is
+    left behind."""
+    parts = [part.encode('utf-8') if isinstance(part, str)
+             else memoryview(part).cast('B') for part in parts]
+    buffer = bytearray(sum(len(part) for part in parts))
+    start = 0
+    for part in parts:
+        buffer[start:start+len(part)] = part
+        start += len(part)
+    return buffer
+
+
+class _Wiped:
+
+    """Stand-in for the hash and HMAC states of a wiped generator."""
+
+    def copy(self):
+        raise ValueError("the generator has been wiped")
+
+
+class Generator:
+
+    """Derive SuperGenPass passwords and PINs from a fixed master password.
+
+    All the work depending only on the master password (encoding, hashing of
+    the "master:" prefix and HMAC key schedule) is done once, when the
+    generator is created, and reused for every domain.
+
+    The master password, the salt and the domain names may be given as str
+    or as bytes-like objects (bytes, bytearray, memoryview) holding UTF-8.
+    The generator keeps a single copy of the master password and salt, which
+    wipe overwrites; used as a context manager, the generator is wiped on
+    exit. The caller may then wipe its own buffer, e.g., with
+    buffer[:] = bytes(len(buffer)).
+
+    """
+
+    def __init__(self, master, salt='', algorithm='md5'):
+        """Initialize the generator.
+
+        Arguments:
+        master -- the master password (str or bytes-like object)
+        salt -- salt to append to the master password (str or bytes-like
+                object)
+        algorithm -- hash algorithm to use for passwords, either a hashlib
+                     algorithm or a key-stretching algorithm such as
+                     'pbkdf2-sha256:100000' or 'scrypt:16384:8:1' (see
+                     calibrate)
+
+        """
+        self.algorithm = algorithm
+        base, self._kdf = _parse_algorithm(algorithm)
+        self._new = _hash_constructor(base)
+        self._master = _buffer(master, salt)
+        self._prefix = self._new(self._master)
+        self._prefix.update(b':')
+        self._hmac = None
+
+    def wipe(self):
+        """Overwrite the copy of the master password held by the generator.
+        The generator cannot derive anything afterwards."""
+        self._master[:] = bytes(len(self._master))
+        self._prefix = _Wiped()
+        self._hmac = _Wiped(), _Wiped()
+        self._kdf = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.wipe()
+
+    def _chain(self, domain):
+        """Return the password (bytes) after the 10 mandatory rounds."""
+        new = self._new
+        b2a = binascii.b2a_base64
+        table = _b64_table
+        if isinstance(domain, str):
+            domain = domain.encode('utf-8')
+        if self._kdf is None:
+            h = self._prefix.copy()
+            h.update(domain)
+            digest = h.digest()
+        else:
+            digest = self._kdf(self._master, domain)
+        password = b2a(digest, newline=False).translate(table)
+        for _ in range(9):
+            password = b2a(new(password).digest(),
+                           newline=False).translate(table)
+        return password
+
+    def _walk(self, domain, length):
+        """Walk the hash chain until the password of given length is valid.
+        Return the password with the number of hash rounds walked."""
+        new = self._new
+        b2a = binascii.b2a_base64
+        table = _b64_table
+        password = self._chain(domain)
+        rounds = 10
+        while not _valid_prefix(password, length):
+            password = b2a(new(password).digest(),
+                           newline=False).translate(table)
+            rounds += 1
+        return password[:length].decode('ascii'), rounds
+
+    def _walk_lengths(self, domain, lengths):
+        """Walk the hash chain once until the passwords of all the given
+        lengths are valid. Return a dictionary mapping each length to the
+        password with the number of hash rounds walked to find it."""
+        new = self._new
+        b2a = binascii.b2a_base64
+        table = _b64_table
+        password = self._chain(domain)
+        rounds = 10
+        results = {}
+        pending = set(lengths)
+        while True:
+            for length in list(pending):
+                if _valid_prefix(password, length):
+                    results[length] = (password[:length].decode('ascii'),
+                                       rounds)
+                    pending.remove(length)
+            if not pending:
+                return results
+            password = b2a(new(password).digest(),
+                           newline=False).translate(table)
+            rounds += 1
+
+    def password(self, domain, length=10):
+        """Derive a SuperGenPass password for a domain name.
+
+        The domain name will be used as is. Use strip_domain to preprocess a
+        URL.
+
+        Arguments:
+        domain -- the domain name
+        length -- length of the desired password
+
+        """
+        return self._walk(domain, length)[0]
+
+    def passwords(self, domain, lengths):
+        """Derive SuperGenPass passwords of several lengths for a domain name,
+        walking the hash chain only once. Return a list with the password for
+        each length, in the same order as lengths.
+
+        Arguments:
+        domain -- the domain name
+        lengths -- iterable of desired password lengths
+
+        """
+        lengths = list(lengths)
+        results = self._walk_lengths(domain, lengths)
+        return [results[length][0] for length in lengths]
+
+    def _digest(self, counter, suffix=b''):
+        """Return the HMAC-SHA-1 digest of counter + suffix keyed with the
+        master password, using the prepared key schedule."""
+        if self._hmac is None:
+            self._hmac = _hmac_sha1(self._master)
+        return _hmac_digest(self._hmac, counter, suffix)
+
+    def _hotp(self, counter, length, suffix=b''):
+        """Return hotp(master, counter + suffix, length) as an integer, using
+        the prepared key schedule."""
+        return _truncate(self._digest(counter, suffix), length)
+
+    def _pin_candidates(self, domain):
+        """Yield the HMAC digests a PIN for domain (bytes) is taken from, in
+        turn: of the domain name, then of the domain name followed by " 0",
+        " 1", ..., " 99"."""
+        yield self._digest(domain)
+        for run in range(100):
+            yield self._digest(domain, " {}".format(run).encode('utf-8'))
+
+    def _pin(self, domain, length, candidates=None):
+        """Return the PIN for a domain name (bytes) as an integer, with the
+        number of bad PINs rejected to find it (100 and a bad PIN if all the
+        candidates are bad).
+
+        Arguments:
+        domain -- the domain name
+        length -- length of the desired PIN
+        candidates -- iterable over the digests of _pin_candidates(domain),
+                      e.g., to share them between lengths
+
+        """
+        if candidates is None:
+            candidates = self._pin_candidates(domain)
+        bad_pin = _bad_pin_test(length)
+        for run, digest in enumerate(candidates):
+            pin = _truncate(digest, length)
+            if not bad_pin(pin):
+                break
+        return pin, run
+
+    def pin(self, domain, length=4):
+        """Derive a Personal Identification Number (PIN) for a domain name.
+
+        The domain name will be used as is. Use strip_domain to preprocess a
+        URL.
+
+        Arguments:
+        domain -- the domain name
+        length -- length of the desired PIN
+
+        """
+        if isinstance(domain, str):
+            domain = domain.encode('utf-8')
+        pin = self._pin(domain, length)[0]
+        return ("{:0" + str(length) + "d}").format(pin)
+
+
+def generate(master, domain, length=10, algorithm='md5', salt=''):
+    """Derive a SuperGenPass password from a master password and a domain name.
+
+    The domain name will be used as is. Use strip_domain to preprocess a URL.
+    Use a Generator to derive passwords for many domains.
+
+    Arguments:
+    master -- the master password (str or bytes-like object)
+    domain -- the domain name (str or bytes-like object)
+    length -- length of the desired password
+    algorithm -- hash algorithm to use (see Generator)
+    salt -- salt to append to the master password
+
+    """
+    if _cache is not None:
+        key = _cache.key('password', master, salt, algorithm, domain, length)
+        password = _cache.get(key)
+        if password is not None:
+            return password
+    with Generator(master, salt, algorithm) as generator:
+        password = generator.password(domain, length)
+    if _cache is not None:
+        _cache.put(key, password)
+    return password
+
+
+def generate_lengths(master, domain, lengths, algorithm='md5', salt=''):
+    """Derive SuperGenPass passwords of several lengths at once.
+
+    This is equivalent to calling generate for each length, but the hash
+    chain is walked only once. Return a list with the password for each
+    length, in the same order as lengths.
+
+    Arguments:
+    master -- the master password (str or bytes-like object)
+    domain -- the domain name (str or bytes-like object)
+    lengths -- iterable of desired password lengths
+    algorithm -- hash algorithm to use
+    salt -- salt to append to the master password
+
+    """
+    with Generator(master, salt, algorithm) as generator:
+        return generator.passwords(domain, lengths)
+
+
+def generate_pin(master, domain, length=4, salt=''):
     """Derive a Personal Identification Number (PIN) from a master password and
     a domain name.
 
     The domain name will be used as is. Use strip_domain to preprocess a URL.
+    Use a Generator to derive PINs for many domains.
 
     Arguments:
-    master -- the master password
-    domain -- the domain name
+    master -- the master password (str or bytes-like object)
+    domain -- the domain name (str or bytes-like object)
     length -- length of the desired PIN
+    salt -- salt to append to the master password
 
     """
-    master = master.encode('utf-8')
-    domain = domain.encode('utf-8')
-    pin = hotp(master, domain, length)
-    run = 0
-    while _bad_pin(pin) and run < 100:
-        suffix = " " + str(run)
-        pin = hotp(master, domain + suffix.encode('utf-8'), length)
-        run += 1
+    if _cache is not None:
+        key = _cache.key('pin', master, salt, None, domain, length)
+        pin = _cache.get(key)
+        if pin is not None:
+            return pin
+    with Generator(master, salt) as generator:
+        pin = generator.pin(domain, length)
+    if _cache is not None:
+        _cache.put(key, pin)
     return pin
 
 
-# Set of TLDs from SuperGenPass script
-with open(os.path.join(data_dir, 'tldlist.json')) as f:
-    _toplevel_domains = set(json.load(f))
+def _derivation_time(algorithm, repeat=3):
+    """Return the best time, in seconds, of deriving a password with
+    algorithm."""
+    import time
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        Generator("calibration", algorithm=algorithm).password("example.com")
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
 
 
-# Matcher for an IPv4 address
-_ip_address = re.compile(r"^[0-9]{1,3}(?:\.[0-9]{1,3}){3}$")
+def calibrate(target_ms, method='pbkdf2-sha256', maxmem=1 << 27):
+    """Choose the cost parameters of a key-stretching algorithm so that
+    deriving a password takes about target_ms milliseconds on this machine.
+    Return the algorithm name, to be given to generate or Generator.
 
+    Arguments:
+    target_ms -- target derivation time, in milliseconds
+    method -- 'pbkdf2-HASH' (e.g., 'pbkdf2-sha256') or 'scrypt'
+    maxmem -- maximum memory used by scrypt, in bytes
 
-def strip_domain(domain):
-    """Strip a domain name/url to its base domain name. Return the stripped
-    domain name or None if not a domain name or url."""
+    """
+    target = target_ms / 1000
+    if method.startswith('pbkdf2-'):
+        # Find a measurable number of iterations, then scale it linearly
+        iterations = 1000
+        elapsed = _derivation_time("{}:{}".format(method, iterations))
+        while elapsed < min(target, 0.05) / 2:
+            iterations *= 10
+            elapsed = _derivation_time("{}:{}".format(method, iterations))
+        iterations = max(1, int(iterations * target / elapsed))
+        # keep two significant digits
+        scale = 10 ** max(0, len(str(iterations)) - 2)
+        iterations = max(1, iterations // scale * scale)
+        return "{}:{}".format(method, iterations)
+    elif method == 'scrypt':
+        # Double the cost while the time stays within target, r=8 and p=1
+        n = 1024
+        elapsed = _derivation_time("scrypt:{}:8:1".format(n))
+        while elapsed * 2 <= target and 128 * 8 * n * 2 <= maxmem:
+            n *= 2
+            elapsed = _derivation_time("scrypt:{}:8:1".format(n))
+        return "scrypt:{}:8:1".format(n)
+    raise ValueError("unsupported key-stretching method: {}".format(method))
+
+
+# Public suffixes (TLDs) from SuperGenPass script. The JSON list is compiled
+# at install time into the finished trie below, stored with marshal so that
+# loading it needs no parsing.
+_suffix_list = os.path.join(data_dir, 'tldlist.json')
+_suffix_index = os.path.join(data_dir, 'tldlist.marshal')
+
+# Public suffixes loaded on first use. The dictionary maps each suffix of at
+# least two labels, and each such tail of a longer suffix, to whether it is
+# itself a public suffix. It thus acts as a trie keyed by label sequences.
+_suffixes = None
+
+
+def _suffix_trie(source=_suffix_list):
+    """Build the trie of the public suffixes from the JSON list source."""
+    import json
+    with open(source) as f:
+        suffixes = json.load(f)
+    trie = {}
+    for suffix in suffixes:
+        dot = suffix.find('.')
+        trie[suffix] = True
+        while dot >= 0:
+            tail = suffix[dot+1:]
+            dot = suffix.find('.', dot + 1)
+            if dot >= 0:
+                trie.setdefault(tail, False)
+    return trie
+
+
+def _compile_suffixes(source=_suffix_list, target=_suffix_index):
+    """Compile the JSON list of public suffixes source into the trie file
+    target."""
+    import marshal
+    trie = _suffix_trie(source)
+    with open(target, 'wb') as f:
+        marshal.dump(trie, f)
+
+
+def _load_suffixes():
+    """Load the public suffixes from the compiled trie, or from the JSON list
+    if the trie has not been compiled (or was compiled by an incompatible
+    version of Python)."""
+    global _suffixes
+    import marshal
+    try:
+        with open(_suffix_index, 'rb') as f:
+            trie = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        trie = None
+    if not isinstance(trie, dict):
+        trie = _suffix_trie()
+    _suffixes = trie
+    return trie
+
+
+# IPv4 addresses, kept as is by strip_domain. _ip_address is compiled on
+# first use by _compile_ip_address, as importing re is slow.
+_ip_address_pattern = r"^[0-9]{1,3}(?:\.[0-9]{1,3}){3}$"
+_ip_address = None
+
+
+def _compile_ip_address():
+    """Compile _ip_address and return it."""
+    global _ip_address
+    import re
+    _ip_address = re.compile(_ip_address_pattern)
+    return _ip_address
+
+
+# Characters allowed in a URL scheme
+_scheme_chars = ('abcdefghijklmnopqrstuvwxyz'
+                 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+                 '0123456789'
+                 '+-.')
+
+
+def _scan_host(url):
+    """Return the network location of url, as urllib.parse.urlparse would,
+    or None if url must be handed over to urlparse.
+
+    Only printable ASCII URLs are scanned; anything urlparse would clean up
+    or validate (control characters, leading spaces, non-ASCII or IPv6 hosts)
+    is left to urlparse.
+
+    """
+    if url.isascii() and url.isprintable() and url[:1] != ' ':
+        start = 0
+        colon = url.find(':')
+        if colon > 0 and url[0].isalpha() and \
+                not url[:colon].strip(_scheme_chars):
+            start = colon + 1
+        if not url.startswith('//', start):
+            return ''
+        end = len(url)
+        for c in '/?#':
+            delim = url.find(c, start + 2, end)
+            if delim >= 0:
+                end = delim
+        host = url[start+2:end]
+        if '[' not in host and ']' not in host:
+            return host
+    return None
+
+
+def _url_host(url):
+    """Return the network location of url, as urllib.parse.urlparse would."""
+    host = _scan_host(url)
+    if host is None:
+        import urllib.parse
+        host = urllib.parse.urlparse(url).netloc
+    return host
+
+
+def _host(domain):
+    """Return the lowercase host of a domain name/url."""
     domain = domain.lower()
     if '/' in domain or ':' in domain:
-        domain = urllib.parse.urlparse(domain).netloc
-    if _ip_address.match(domain):
+        domain = _url_host(domain)
+    return domain
+
+
+def _strip_host(domain):
+    """Strip a lowercase host to its base domain name."""
+    if domain[:1].isdigit() and \
+            (_ip_address or _compile_ip_address()).match(domain):
         return domain
-    parts = domain.split('.')
-    if len(parts) < 2:
+    # Keep one label more than the longest matching public suffix, and at
+    # least two labels. Scan the dots from right to left, starting with the
+    # suffix of two labels: dot is the position of the dot before the current
+    # suffix candidate, start the position of the dot before the kept labels
+    # (-1 to keep the whole domain).
+    suffixes = _suffixes or _load_suffixes()
+    dot = domain.rfind('.')
+    if dot < 0:
         return None
-    elif len(parts) >= 3 and '.'.join(parts[-2:]) in _toplevel_domains:
-        return '.'.join(parts[-3:])
+    start = dot = domain.rfind('.', 0, dot)
+    while dot >= 0:
+        found = suffixes.get(domain[dot+1:])
+        if found is None:
+            break
+        dot = domain.rfind('.', 0, dot)
+        if found:
+            start = dot
+    return domain[start+1:]
+
+
+def strip_domain(domain):
+    """Strip a domain name/url to its base domain name. Return the stripped
+    domain name or None if not a domain name or url."""
+    if _cache is not None:
+        key = _cache.key('strip', domain)
+        result = _cache.get(key, _missing)
+        if result is not _missing:
+            return result
+        result = _strip_host(_host(domain))
+        _cache.put(key, result)
+        return result
+    return _strip_host(_host(domain))
+
+
+# Cache of generate, generate_pin and strip_domain (see enable_cache)
+_cache = None
+_missing = object()
+
+
+def enable_cache(enabled=True, maxsize=256, ttl=300):
+    """Turn the caching of results on or off.
+
+    While enabled, generate, generate_pin and strip_domain remember their
+    results, so that a repeated call costs a dictionary lookup. The cache
+    is keyed by a digest of the arguments with a random secret; the master
+    password is not stored. Results are evicted, and overwritten, when they
+    have not been used for the longest time and more than maxsize are
+    cached, or once they are more than ttl seconds old: expired results are
+    purged by the next call using the cache (call clear_cache to purge them
+    at once). Caching is off by default. Enabling the cache again, or
+    disabling it, clears it.
+
+    Arguments:
+    enabled -- whether to cache results
+    maxsize -- maximum number of cached results
+    ttl -- time (in seconds) a result is kept, or None to keep results until
+           they are evicted
+
+    """
+    global _cache
+    if _cache is not None:
+        _cache.clear()
+    if enabled:
+        from .cache import Cache
+        _cache = Cache(maxsize, ttl)
     else:
-        return '.'.join(parts[-2:])
+        _cache = None
+
+
+def clear_cache():
+    """Overwrite and remove the results cached since enable_cache."""
+    if _cache is not None:
+        _cache.clear()
+
+
+def cache_info():
+    """Return the statistics of the cache as a dictionary with keys 'hits',
+    'misses', 'size', 'maxsize' and 'ttl', or None if caching is off."""
+    return None if _cache is None else _cache.info()
+
+
+def enable_stats(enabled=True):
+    """Turn the collection of statistics on or off.
+
+    While enabled, password and PIN derivations and strip_domain count their
+    work and time themselves; see stats. Statistics are off by default and
+    cost nothing then: the instrumented code is only installed when enabled.
+    Derivations done in other processes (e.g., by the batch module with
+    several workers) are not counted.
+
+    """
+    from . import instrument
+    instrument.enable(enabled)
+
+
+def stats(reset=False):
+    """Return the statistics collected while enabled (see enable_stats) as a
+    dictionary with the following keys:
+
+    passwords -- number of passwords derived
+    rounds -- number of hash rounds
+    checks -- number of password validity checks
+    pins -- number of PINs derived
+    pin_retries -- number of bad PINs rejected
+    pin_exhausted -- number of PINs returned although bad, after 100 retries
+    hosts -- number of hosts extracted from domain names/urls, either as is
+             ('host_plain'), by scanning the url ('host_scan') or with
+             urllib.parse ('host_urlparse')
+    strips -- number of hosts stripped, being IP addresses ('strip_ip'),
+              invalid ('strip_invalid') or looked up in the public suffixes
+              ('strip_suffix')
+    rounds_histogram -- dictionary mapping a number of rounds to the number
+                        of hash chains of that length
+    retries_histogram -- dictionary mapping a number of PIN retries to the
+                         number of PINs needing it
+    latency -- dictionary mapping 'password', 'pin', 'host' and 'strip' to
+               a histogram of the time per call: each key is an upper bound
+               in nanoseconds (a power of two), each value the number of
+               calls taking less than the bound and at least half of it
+    enabled -- whether statistics are being collected
+
+    Arguments:
+    reset -- whether to clear the statistics after reading them
+
+    """
+    from . import instrument
+    return instrument.snapshot(reset)
+
+
+def strip_domains(domains, cache_size=65536, stats=None):
+    """Strip many domain names/urls to their base domain names.
+
+    Return an iterator over the results of strip_domain for each item of
+    domains, None for malformed URLs strip_domain raises ValueError for (so
+    that one bad item does not end the stream). Results are memoized by host
+    in a LRU cache, which pays off for inputs with many repetitions such as
+    browsing histories or proxy logs.
+
+    Arguments:
+    domains -- iterable of domain names/urls
+    cache_size -- maximum number of hosts in the cache
+    stats -- if not None, a dictionary updated with the number of items
+             ('count') and of cache hits and misses ('hits' and 'misses')
+             once the iterator is exhausted or closed
+
+    """
+    import functools
+    strip = functools.lru_cache(cache_size)(_strip_host)
+    count = 0
+    try:
+        for domain in domains:
+            count += 1
+            try:
+                host = _host(domain)
+            except ValueError:  # e.g., invalid IPv6 URL
+                yield None
+                continue
+            yield strip(host)
+    finally:
+        if stats is not None:
+            info = strip.cache_info()
+            stats.update(count=count, hits=info.hits, misses=info.misses)
@@ -14,13 +14,13 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+# Modules only needed by some commands or options are imported where they
+# are used, to keep the startup of the common case fast.
 import os
 import os.path
 import sys
-import argparse
 import configparser
 import getpass
-import hashlib
 from . import *
 
 
@@ -42,7 +42,7 @@ config.read([config_system, config_user])
 config = config[__package__]
 
 
-# Parse arguments
+# Types of the command-line arguments
 def type_length(arg):
     arg = int(arg)
     if arg < 4:
@@ -50,6 +50,29 @@ def type_length(arg):
     return arg
 
 
+def _ranges(arg, item_type):
+    """Parse a comma-separated list of items and ranges (e.g., 8,10-12), each
+    item being converted with item_type."""
+    items = []
+    try:
+        for item in arg.split(','):
+            first, sep, last = item.partition('-')
+            if sep:
+                items.extend(range(item_type(first), item_type(last) + 1))
+            else:
+                items.append(item_type(item))
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid length: {}".format(arg))
+    if not items:
+        raise argparse.ArgumentTypeError("empty length range: {}".format(arg))
+    return items
+
+
+def type_lengths(arg):
+    """Parse a comma-separated list of lengths and ranges (e.g., 8,10-12)."""
+    return _ranges(arg, type_length)
+
+
 def type_pinlength(arg):
     arg = int(arg)
     if arg < 3 or arg > 8:
@@ -57,67 +80,824 @@ def type_pinlength(arg):
     return arg
 
 
+def type_pinlengths(arg):
+    """Parse a comma-separated list of PIN lengths and ranges (e.g., 4-6), or
+    'none'."""
+    if arg == 'none':
+        return []
+    return _ranges(arg, type_pinlength)
+
+
+def valid_algorithm(arg):
+    """Return True if arg names an available hash or key-stretching
+    algorithm."""
+    try:
+        Generator('', algorithm=arg)
+    except ValueError:
+        return False
+    return True
+
+
 def type_algorithm(arg):
-    if arg not in hashlib.algorithms_available:
+    if not valid_algorithm(arg):
         raise argparse.ArgumentTypeError("hash algorithm {} is not available"
                                          .format(arg))
     return arg
 
 
-parser = argparse.ArgumentParser()
-parser.description = "Derive a SuperGenPass password from a master password " \
-                     "and a domain name."
-parser.add_argument("domain", nargs='?', help="domain name")
-parser.add_argument("-p", "--pin", action='store_true',
-                    help="generate a PIN instead of a password")
-group = parser.add_mutually_exclusive_group()
-group.add_argument("-n", "--nostrip", action='store_false', dest='strip',
-                   help="use domain name as is without stripping")
-group.add_argument("-g", "--graphical", action='store_true',
-                   help="launch graphical user interface")
-group = parser.add_argument_group("generator options")
-group.description = "These options define how the password will be " \
-                    "generated. The default options may be set in " + \
-                    config_user + " or " + config_system + ". Options are " \
-                    "set under the [" + __package__ + "] section, keys are " \
-                    "the long arguments names."
-group.add_argument("-l", "--length", type=type_length,
-                   default=int(config['length']),
-                   help="length of the generated password (default: "
-                        "%(default)s)")
-group.add_argument("-L", "--pinlength", type=type_pinlength,
-                   default=int(config['pinlength']),
-                   help="length of the generated PIN (default: %(default)s)")
-group.add_argument("-a", "--algorithm", type=type_algorithm,
-                   default=config['algorithm'],
-                   help="hash algorithm (default: %(default)s)")
-group.add_argument("-s", "--salt", default=config['salt'],
-                   help="salt to append to the master password")
-args = parser.parse_args()
+def type_jobs(arg):
+    arg = int(arg)
+    if arg < 1:
+        raise argparse.ArgumentTypeError("number of jobs must be at least 1")
+    return arg
+
+
+def strip(domain):
+    """Return strip_domain(domain), or None if domain is not a valid domain
+    name or URL, including malformed URLs strip_domain raises ValueError
+    for (e.g., http://[x)."""
+    try:
+        return strip_domain(domain)
+    except ValueError:
+        return None
+
+
+def given_options(parser, argv, fields):
+    """Return the set of fields given explicitly in argv (default:
+    sys.argv[1:]) to parser, by parsing again with markers instead of
+    defaults."""
+    import argparse
+    marker = object()
+    namespace = argparse.Namespace(**{field: marker for field in fields})
+    parser.parse_args(argv, namespace=namespace)
+    return {field for field in fields
+            if getattr(namespace, field) is not marker}
+
+
+def profile_lookup(defaults, given=()):
+    """Return a function mapping a stripped domain name (or None) to its
+    options: defaults, overridden by the options of its profile, if any, that
+    are not in given. Recent lookups are cached, so that the profile database
+    is queried once per domain name of a long input.
+
+    Arguments:
+    defaults -- dictionary of options (some of profiles.fields)
+    given -- options given on the command line, which profiles do not
+             override
+
+    """
+    import functools
+    from . import profiles
+    store = profiles.Profiles()
+
+    @functools.lru_cache(4096)
+    def lookup(domain):
+        profile = store.get(domain) if domain else None
+        if not profile:
+            return defaults
+        options = dict(defaults)
+        options.update((field, value) for field, value in profile.items()
+                       if field in defaults and field not in given)
+        return options
+    return lookup
+
+
+# Commands, given as first argument instead of a domain name
+def command_strip(argv):
+    """Strip domain names/URLs read from files or the standard input."""
+    import time
+    parser = argparse.ArgumentParser(prog=prog + " strip")
+    parser.description = "Strip domain names or URLs, read one per line, " \
+                         "to their base domain names. An empty line is " \
+                         "written for invalid domain names."
+    parser.add_argument("files", nargs='*', metavar="FILE",
+                        help="input files (default: standard input)")
+    parser.add_argument("-c", "--cache-size", type=int, default=65536,
+                        help="maximum number of hosts in the cache "
+                             "(default: %(default)s)")
+    parser.add_argument("--stats", action='store_true',
+                        help="print the cache hit rate, throughput and "
+                             "parsing statistics on standard error")
+    args = parser.parse_args(argv)
+    if args.stats:
+        enable_stats()
+
+    def lines(blocksize=1 << 20):
+        for name in args.files or ['-']:
+            if name == '-':
+                f = open(sys.stdin.fileno(), buffering=blocksize,
+                         closefd=False)
+            else:
+                try:
+                    f = open(name, buffering=blocksize)
+                except OSError as e:
+                    parser.error("can't open '{}': {}".format(name,
+                                                              e.strerror))
+            with f:
+                for block in iter(lambda: f.readlines(blocksize), []):
+                    for line in block:
+                        yield line.rstrip('\r\n')
+
+    cache_stats = {}
+    start = time.perf_counter()
+    try:
+        for domain in strip_domains(lines(), args.cache_size, cache_stats):
+            sys.stdout.write((domain or '') + '\n')
+    except KeyboardInterrupt:
+        pass
+    sys.stdout.flush()
+    if args.stats:
+        elapsed = time.perf_counter() - start
+        count = cache_stats['count']
+        print("{} lines in {:.3f}s ({:.0f} lines/s), cache hit rate {:.1%}"
+              .format(count, elapsed, count / elapsed if elapsed else 0,
+                      cache_stats['hits'] / count if count else 0),
+              file=sys.stderr)
+        from . import instrument
+        instrument.report(stats())
+
+
+def command_agent(argv):
+    """Run the agent holding the master password."""
+    from . import agent
+    parser = argparse.ArgumentParser(prog=prog + " agent")
+    parser.description = "Ask the master password once and keep it in " \
+                         "memory to answer the requests of other " \
+                         "supergenpass processes over a Unix socket."
+    parser.add_argument("-t", "--timeout", type=float, default=900,
+                        help="forget the master password and exit after "
+                             "TIMEOUT seconds without requests, 0 to never "
+                             "exit (default: %(default)s)")
+    parser.add_argument("-s", "--salt", default=config['salt'],
+                        help="salt to append to the master password")
+    parser.add_argument("-S", "--socket", default=agent.socket_path(),
+                        help="path of the socket (default: %(default)s)")
+    args = parser.parse_args(argv)
+    try:
+        master = getpass.getpass("Master password: ")
+        print("Agent listening on", args.socket, file=sys.stderr)
+        agent.Agent(master, args.salt, args.timeout or None).run(args.socket)
+    except agent.AgentError as e:
+        parser.error(str(e))
+    except KeyboardInterrupt:
+        print(file=sys.stderr)
+
+
+def command_analyze(argv):
+    """Estimate the distribution of rounds and PIN retries, and the cost of
+    derivations."""
+    import json
+    from . import analyze
+    parser = argparse.ArgumentParser(prog=prog + " analyze")
+    parser.description = "Derive passwords and PINs for random master " \
+                         "passwords and domain names, and report the " \
+                         "distribution of hash rounds beyond the first 10 " \
+                         "and of bad PIN retries, with the expected CPU " \
+                         "time per derivation."
+    parser.add_argument("-n", "--samples", type=int, default=100000,
+                        help="number of random derivations (default: "
+                             "%(default)s)")
+    parser.add_argument("-a", "--algorithm", type=type_algorithm,
+                        action='append',
+                        help="hash algorithm, may be repeated (default: "
+                             "{})".format(config['algorithm']))
+    parser.add_argument("-l", "--length", type=type_lengths, default="4-24",
+                        help="password lengths (default: %(default)s)")
+    parser.add_argument("-L", "--pinlength", type=type_pinlengths,
+                        default="3-8",
+                        help="PIN lengths, or 'none' (default: "
+                             "%(default)s)")
+    parser.add_argument("-j", "--jobs", type=type_jobs,
+                        help="number of parallel processes (default: number "
+                             "of CPUs)")
+    parser.add_argument("--seed", type=int,
+                        help="seed of the random inputs")
+    parser.add_argument("--json", action='store_true',
+                        help="write the full results, with histograms, as "
+                             "JSON")
+    args = parser.parse_args(argv)
+    try:
+        result = analyze.analyze(args.samples,
+                                 args.algorithm or [config['algorithm']],
+                                 args.length, args.pinlength, args.seed,
+                                 workers=args.jobs)
+    except ValueError as e:
+        parser.error(str(e))
+    except KeyboardInterrupt:
+        print(file=sys.stderr)
+        sys.exit(1)
+    if args.json:
+        result['passwords'] = [dict(summary, algorithm=algorithm,
+                                    length=length)
+                               for (algorithm, length), summary
+                               in result['passwords'].items()]
+        result['pins'] = [dict(summary, length=length)
+                          for length, summary in result['pins'].items()]
+        json.dump(result, sys.stdout, indent=2)
+        print()
+        return
+    width = max([len("algorithm")] +
+                [len(algorithm) for algorithm, _ in result['passwords']])
+    header = "{:" + str(width) + "} {:>6} {:>7}" + " {:>6}" * 5 + \
+             " {:>10} {:>10}"
+    row = "{:" + str(width) + "} {:6d} {:7.3f}" + " {:6d}" * 5 + \
+          " {:8.2f}us {:8.2f}us"
+    titles = ["mean"] + ["p{:g}".format(p) for p in analyze.percentiles] + \
+             ["max", "cost", "p99 cost"]
+    print("{} samples, seed {}".format(result['samples'], result['seed']))
+    print()
+    print("Hash rounds beyond the first 10")
+    print(header.format("algorithm", "length", *titles))
+    for (algorithm, length), summary in result['passwords'].items():
+        print(row.format(algorithm, length, summary['mean'],
+                         *summary['percentiles'].values(), summary['max'],
+                         summary['cost'] * 1e6, summary['cost_p99'] * 1e6))
+    if result['pins']:
+        print()
+        print("Bad PIN retries")
+        print(header.format("", "length", *titles))
+        for length, summary in result['pins'].items():
+            print(row.format("PIN", length, summary['mean'],
+                             *summary['percentiles'].values(),
+                             summary['max'], summary['cost'] * 1e6,
+                             summary['cost_p99'] * 1e6))
+
+
+def store_option(key, value, path=config_user):
+    """Set key to value in the section of the package of the configuration
+    file path, leaving the rest of the file (comments, order of the keys
+    and sections) as is. The section is appended if missing."""
+    import re
+    try:
+        with open(path) as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        lines = []
+    header = re.compile(r'\[([^]]*)\]')
+    option = re.compile(r'\s*([^=:]*?)\s*[=:]')
+    setting = "{} = {}".format(key, value)
+    section = None
+    end = None  # index after the last setting of the section, if any
+    for index, line in enumerate(lines):
+        match = header.match(line)
+        if match:
+            section = match.group(1).strip()
+            if section == __package__ and end is None:
+                end = index + 1
+        elif section == __package__:
+            match = option.match(line)
+            if match and not line[:1].isspace() and \
+                    match.group(1).lower() == key:
+                # replace the key and its continuation lines
+                end = index + 1
+                while end < len(lines) and lines[end][:1].isspace() and \
+                        lines[end].strip():
+                    end += 1
+                lines[index:end] = [setting]
+                break
+            if line.strip() and not line.lstrip().startswith(('#', ';')):
+                end = index + 1
+    else:
+        if end is None:
+            lines += ([""] if lines else []) + ["[" + __package__ + "]",
+                                                setting]
+        else:
+            lines.insert(end, setting)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def command_calibrate(argv):
+    """Choose the parameters of a key-stretching algorithm for a target
+    derivation time."""
+    parser = argparse.ArgumentParser(prog=prog + " calibrate")
+    parser.description = "Choose the cost parameters of a key-stretching " \
+                         "algorithm so that deriving a password takes " \
+                         "about TARGET milliseconds on this machine, and " \
+                         "print the algorithm name. Passwords derived with " \
+                         "it differ from the plain SuperGenPass ones."
+    parser.add_argument("target", type=float, nargs='?', default=250,
+                        help="target derivation time in milliseconds "
+                             "(default: %(default)s)")
+    parser.add_argument("-m", "--method", default='pbkdf2-sha256',
+                        help="pbkdf2-HASH (e.g., pbkdf2-sha512) or scrypt "
+                             "(default: %(default)s)")
+    parser.add_argument("-w", "--write", action='store_true',
+                        help="store the algorithm as default in " +
+                             config_user)
+    args = parser.parse_args(argv)
+    if args.target <= 0:
+        parser.error("the target time must be positive")
+    try:
+        algorithm = calibrate(args.target, args.method)
+    except ValueError as e:
+        parser.error(str(e))
+    from . import _derivation_time
+    print(algorithm)
+    print("{:.0f}ms per password".format(_derivation_time(algorithm) * 1e3),
+          file=sys.stderr)
+    if args.write:
+        store_option('algorithm', algorithm)
+        print("Default algorithm stored in", config_user, file=sys.stderr)
+
+
+def command_profile(argv):
+    """Manage the per-site profiles."""
+    from . import profiles
+    parser = argparse.ArgumentParser(prog=prog + " profile")
+    parser.description = "Manage the per-site profiles, which override the " \
+                         "default generator options for some domains. " \
+                         "Profiles are applied automatically, options " \
+                         "given on the command line taking precedence."
+    parser.add_argument("-d", "--database", default=profiles.database_path(),
+                        help="path of the profile database (default: "
+                             "%(default)s)")
+    actions = parser.add_subparsers(dest='action', metavar="ACTION")
+    actions.required = True
+    action = actions.add_parser("list", help="list the profiles")
+    action.add_argument("prefix", nargs='?', default='',
+                        help="only list the domains starting with PREFIX")
+    action = actions.add_parser("set", help="create or update a profile")
+    action.add_argument("domain", help="domain name")
+    action.add_argument("-l", "--length", type=type_length,
+                        help="length of the password")
+    action.add_argument("-L", "--pinlength", type=type_pinlength,
+                        help="length of the PIN")
+    action.add_argument("-a", "--algorithm", type=type_algorithm,
+                        help="hash algorithm")
+    action.add_argument("-s", "--salt",
+                        help="salt to append to the master password")
+    group = action.add_mutually_exclusive_group()
+    group.add_argument("-n", "--nostrip", action='store_false', dest='strip',
+                       default=None,
+                       help="use the domain name as entered, without "
+                            "stripping")
+    group.add_argument("--strip", action='store_true', dest='strip',
+                       default=None, help="strip the domain name")
+    action.add_argument("-r", "--reset", action='append', default=[],
+                        choices=profiles.fields, metavar="OPTION",
+                        help="reset OPTION to its default (one of " +
+                             ", ".join(profiles.fields) + ")")
+    action = actions.add_parser("delete", help="delete a profile")
+    action.add_argument("domain", help="domain name")
+    args = parser.parse_args(argv)
+
+    store = profiles.Profiles(args.database)
+    if args.action == 'list':
+        for domain, profile in store.items():
+            if domain.startswith(args.prefix):
+                print("{}\t{}".format(domain, " ".join(
+                    "{}={}".format(field, profile[field])
+                    for field in profiles.fields if field in profile)))
+        return
+    domain = strip(args.domain)
+    if not domain:
+        parser.error("invalid domain name")
+    if args.action == 'set':
+        options = {field: getattr(args, field) for field in profiles.fields
+                   if getattr(args, field) is not None}
+        options.update((field, None) for field in args.reset)
+        store.set(domain, **options)
+    elif not store.delete(domain):
+        parser.error("no profile for {}".format(domain))
+    store.close()
+
+
+def command_rotate(argv):
+    """Derive the old and new passwords of many domains, to change the master
+    password, the salt or the algorithm."""
+    import itertools
+    import concurrent.futures
+    from . import batch
+    from . import profiles
+    parser = argparse.ArgumentParser(prog=prog + " rotate")
+    parser.description = "Derive the passwords of domain names, read one " \
+                         "per line, with old and new master passwords, " \
+                         "salts or algorithms, and write tab-separated " \
+                         "lines with the input, the domain name, the old " \
+                         "and the new password. The new master password " \
+                         "is asked twice; leave it empty to keep the old " \
+                         "one. The old options of a domain name having a " \
+                         "profile are those of the profile, unless given " \
+                         "on the command line."
+    parser.add_argument("file", nargs='?', default='-',
+                        help="file listing the domain names (default: "
+                             "standard input)")
+    parser.add_argument("-p", "--pin", action='store_true',
+                        help="derive PINs instead of passwords")
+    parser.add_argument("-n", "--nostrip", action='store_false',
+                        dest='strip',
+                        help="use domain names as is without stripping")
+    parser.add_argument("-l", "--length", type=type_length,
+                        default=type_length(config['length']),
+                        help="length of the passwords (default: "
+                             "%(default)s)")
+    parser.add_argument("-L", "--pinlength", type=type_pinlength,
+                        default=int(config['pinlength']),
+                        help="length of the PINs (default: %(default)s)")
+    parser.add_argument("-a", "--algorithm", type=type_algorithm,
+                        default=config['algorithm'],
+                        help="old hash algorithm (default: %(default)s)")
+    parser.add_argument("-A", "--new-algorithm", type=type_algorithm,
+                        help="new hash algorithm (default: the old one)")
+    parser.add_argument("-s", "--salt", default=config['salt'],
+                        help="old salt (default: from the configuration)")
+    parser.add_argument("-S", "--new-salt",
+                        help="new salt (default: the old one)")
+    parser.add_argument("-j", "--jobs", type=type_jobs,
+                        help="number of parallel derivation processes "
+                             "(default: number of CPUs)")
+    args = parser.parse_args(argv)
+    if args.file == '-':
+        f = sys.stdin
+    else:
+        try:
+            f = open(args.file)
+        except OSError as e:
+            parser.error("can't open '{}': {}".format(args.file, e.strerror))
+    jobs = args.jobs or os.cpu_count() or 1
+    lookup = profile_lookup({field: getattr(args, field)
+                             for field in profiles.fields},
+                            given_options(parser, argv, profiles.fields))
+    executor = None
+    try:
+        old = getpass.getpass("Old master password: ")
+        new = getpass.getpass("New master password: ")
+        if new and getpass.getpass("Confirm new master password: ") != new:
+            print("The new master passwords differ", file=sys.stderr)
+            sys.exit(1)
+        new = new or old
+        if jobs > 1:
+            executor = concurrent.futures.ProcessPoolExecutor(jobs)
+        lines = (line.strip() for line in f)
+        lines = (line for line in lines if line)
+        # Large blocks keep every worker busy, while the report is still
+        # written as it is derived
+        for block in iter(lambda: list(itertools.islice(lines, 4096 * jobs)),
+                          []):
+            domains = []
+            groups = {}  # (salt, algorithm) -> [(index, request)]
+            for index, line in enumerate(block):
+                stripped = strip(line)
+                options = lookup(stripped)
+                domain = stripped if options['strip'] else line
+                domains.append(domain)
+                if domain:
+                    length = options['pinlength' if args.pin else 'length']
+                    groups.setdefault(
+                        (options['salt'], options['algorithm']), []).append(
+                        (index, (domain, length)))
+            results = [('', '')] * len(block)
+            for (salt, algorithm), requests in groups.items():
+                pairs = batch.rotate(
+                    (old, salt, algorithm),
+                    (new, salt if args.new_salt is None else args.new_salt,
+                     args.new_algorithm or algorithm),
+                    [request for _, request in requests], args.pin,
+                    executor, jobs)
+                for (index, _), pair in zip(requests, pairs):
+                    results[index] = pair
+            for text, domain, (before, after) in zip(block, domains,
+                                                     results):
+                sys.stdout.write("{}\t{}\t{}\t{}\n".format(
+                    text, domain or '', before, after))
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        print(file=sys.stderr)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        if f is not sys.stdin:
+            f.close()
+
+
+prog = os.path.basename(sys.argv[0])
+commands = {'strip': command_strip,
+            'agent': command_agent,
+            'analyze': command_analyze,
+            'calibrate': command_calibrate,
+            'profile': command_profile,
+            'rotate': command_rotate}
+if len(sys.argv) > 1 and sys.argv[1] in commands:
+    import argparse
+    commands[sys.argv[1]](sys.argv[2:])
+    sys.exit()
+
+
+# Parse arguments
+def make_parser():
+    """Build the parser of the command-line arguments and return it."""
+    global argparse, parser
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.description = "Derive a SuperGenPass password from a master " \
+                         "password and a domain name."
+    parser.epilog = "Other commands, given instead of the domain name: " + \
+                    ", ".join(sorted(commands)) + ". Use " + prog + \
+                    " COMMAND -h for more information."
+    parser.add_argument("domain", nargs='?', help="domain name")
+    parser.add_argument("-p", "--pin", action='store_true',
+                        help="generate a PIN instead of a password")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("-n", "--nostrip", action='store_false', dest='strip',
+                       help="use domain name as is without stripping")
+    group.add_argument("-g", "--graphical", action='store_true',
+                       help="launch graphical user interface")
+    parser.add_argument("--no-agent", action='store_false', dest='agent',
+                        help="do not use a running agent, always ask the "
+                             "master password")
+    parser.add_argument("--stats", action='store_true',
+                        help="print statistics about the derivation (hash "
+                             "rounds, PIN retries, timings) on standard "
+                             "error; implies --no-agent, and derivations in "
+                             "parallel batch jobs are not counted")
+    group = parser.add_argument_group("generator options")
+    group.description = "These options define how the password will be " \
+                        "generated. The default options may be set in " + \
+                        config_user + " or " + config_system + ". Options " \
+                        "are set under the [" + __package__ + "] section, " \
+                        "keys are the long arguments names."
+    group.add_argument("-l", "--length", type=type_lengths,
+                       default=type_lengths(config['length']),
+                       help="length of the generated password, or a list of "
+                            "lengths and ranges such as 8,10-12 (default: "
+                            "{})".format(config['length']))
+    group.add_argument("-L", "--pinlength", type=type_pinlength,
+                       default=int(config['pinlength']),
+                       help="length of the generated PIN (default: "
+                            "%(default)s)")
+    group.add_argument("-a", "--algorithm", type=type_algorithm,
+                       default=config['algorithm'],
+                       help="hash algorithm (default: %(default)s)")
+    group.add_argument("-s", "--salt", default=config['salt'],
+                       help="salt to append to the master password")
+    group = parser.add_argument_group("batch options")
+    group.description = "In batch mode, the master password is asked once " \
+                        "and domain names or URLs are read one per line, " \
+                        "either as plain text or as JSON objects with a " \
+                        "'domain' or 'url' key."
+    group.add_argument("-b", "--batch", nargs='?', const='-', metavar="FILE",
+                       help="read domain names from FILE (default: standard "
+                            "input)")
+    group.add_argument("-f", "--format", choices=['tsv', 'jsonl'],
+                       default='tsv',
+                       help="output format in batch mode (default: "
+                            "%(default)s)")
+    group.add_argument("-j", "--jobs", type=type_jobs, default=1,
+                       help="number of parallel derivation processes in "
+                            "batch mode (default: %(default)s)")
+    return parser
+
+
+def apply_profile(domain):
+    """Apply the profile of domain, if any, to the generator options not
+    given on the command line."""
+    from . import profiles
+    profile = profiles.Profiles().get(domain)
+    if not profile:
+        return
+    given = set()
+    if parser is not None:
+        given = given_options(parser, None, profiles.fields)
+    for field, value in profile.items():
+        if field in given:
+            continue
+        setattr(args, field, [value] if field == 'length' else value)
+
+
+def error(message):
+    """Print a usage message with the error message and exit."""
+    (parser or make_parser()).error(message)
+
+
+# Fast path for the common case of a single derivation with the default
+# options (no arguments, or only a domain name): the parser is not built.
+parser = None
+if (len(sys.argv) == 1 or
+        (len(sys.argv) == 2 and not sys.argv[1].startswith('-'))) and \
+        config['length'].isdigit() and int(config['length']) >= 4 and \
+        config['pinlength'].isdigit() and \
+        3 <= int(config['pinlength']) <= 8 and \
+        valid_algorithm(config['algorithm']):
+    import types
+    args = types.SimpleNamespace()
+    args.domain = sys.argv[1] if len(sys.argv) == 2 else None
+    args.pin = False
+    args.strip = True
+    args.graphical = False
+    args.agent = True
+    args.stats = False
+    args.length = [int(config['length'])]
+    args.pinlength = int(config['pinlength'])
+    args.algorithm = config['algorithm']
+    args.salt = config['salt']
+    args.batch = None
+else:
+    args = make_parser().parse_args()
+if args.batch is not None:
+    if args.graphical:
+        parser.error("argument -b/--batch: not allowed with argument "
+                     "-g/--graphical")
+    if args.domain:
+        parser.error("argument -b/--batch: not allowed with a domain name")
+    if not args.pin and len(args.length) > 1:
+        parser.error("argument -b/--batch: only one length is allowed")
+
+
+def read_batch(f, lookup):
+    """Yield (input, domain, options, error) tuples from the lines of f,
+    options being the options of the domain returned by lookup (see
+    profile_lookup). The domain is None, and error describes why, if the line
+    is not a valid domain name or JSON record."""
+    import json
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('{'):
+            try:
+                item = json.loads(line)
+            except ValueError:
+                yield line, None, None, "invalid JSON record"
+                continue
+            value = item.get('domain') or item.get('url') or ''
+            if not isinstance(value, str):
+                yield line, None, None, "invalid domain name"
+                continue
+            line = value
+        stripped = strip(line)
+        options = lookup(stripped)
+        domain = stripped if options['strip'] else line
+        yield line, domain, options, None if domain else "invalid domain name"
+
+
+def write_batch(f, text, domain, result, error=None):
+    """Write the result (or the error) for one input line to f."""
+    import json
+    if args.format == 'tsv':
+        f.write("{}\t{}\t{}\n".format(text, domain or '', result or ''))
+    else:
+        item = {'input': text, 'domain': domain}
+        if domain:
+            item['pin' if args.pin else 'password'] = result
+        else:
+            item['error'] = error or "invalid domain name"
+        f.write(json.dumps(item) + "\n")
+
+
+def run_batch(master, blocksize=1024):
+    """Derive the passwords or PINs of all domains listed in the batch input.
+
+    Input is processed by blocks of blocksize lines, each block being written
+    and flushed before the next one is read.
+
+    """
+    import itertools
+    if args.batch == '-':
+        f = sys.stdin
+    else:
+        try:
+            f = open(args.batch)
+        except OSError as e:
+            parser.error("argument -b/--batch: can't open '{}': {}"
+                         .format(args.batch, e.strerror))
+    executor = None
+    if args.jobs > 1:
+        import concurrent.futures
+        from . import batch
+        executor = concurrent.futures.ProcessPoolExecutor(args.jobs)
+    from . import profiles
+    defaults = {field: getattr(args, field) for field in profiles.fields}
+    defaults['length'] = args.length[0]
+    lookup = profile_lookup(defaults,
+                            given_options(parser, None, profiles.fields))
+    generators = {}  # (salt, algorithm) -> Generator
+
+    def derive(requests):
+        """Return the results of a list of (domain, options) requests."""
+        if executor is None:
+            results = []
+            for domain, options in requests:
+                key = options['salt'], options['algorithm']
+                if key not in generators:
+                    generators[key] = Generator(master, *key)
+                if args.pin:
+                    results.append(generators[key].pin(
+                        domain, options['pinlength']))
+                else:
+                    results.append(generators[key].password(
+                        domain, options['length']))
+            return results
+        # one parallel derivation per salt, the other options being given
+        # with each request
+        groups = {}
+        for index, (domain, options) in enumerate(requests):
+            groups.setdefault(options['salt'], []).append(index)
+        results = [None] * len(requests)
+        for salt, indices in groups.items():
+            if args.pin:
+                many = batch.generate_pins_many(
+                    master, [(requests[index][0],
+                              requests[index][1]['pinlength'])
+                             for index in indices],
+                    salt, executor, args.jobs)
+            else:
+                many = batch.generate_many(
+                    master, [(requests[index][0],
+                              requests[index][1]['length'],
+                              requests[index][1]['algorithm'])
+                             for index in indices],
+                    salt, executor, args.jobs)
+            for index, result in zip(indices, many):
+                results[index] = result
+        return results
+
+    items = read_batch(f, lookup)
+    try:
+        for block in iter(lambda: list(itertools.islice(items, blocksize)),
+                          []):
+            results = iter(derive([(domain, options)
+                                   for _, domain, options, _ in block
+                                   if domain]))
+            for text, domain, _, error in block:
+                write_batch(sys.stdout, text, domain,
+                            next(results) if domain else None, error)
+            sys.stdout.flush()
+    finally:
+        for generator in generators.values():
+            generator.wipe()
+        if executor is not None:
+            executor.shutdown()
+        if f is not sys.stdin:
+            f.close()
 
 
 # Do real work
+if args.stats:
+    enable_stats()
+    args.agent = False
 if args.graphical:
     from . import gtkui
-    gtkui.GtkUI(args).run()
+    gtkui.GtkUI(parser).run(sys.argv)
+elif args.batch is not None:
+    try:
+        run_batch(getpass.getpass("Master password: "))
+    except KeyboardInterrupt:
+        print(file=sys.stderr)
 else:
     try:
         if args.domain:
             domain = args.domain
         else:
             domain = input("Domain name: ")
+        stripped = strip(domain)
+        if stripped:
+            apply_profile(stripped)
         if args.strip:
-            domain = strip_domain(domain)
+            domain = stripped
         if not domain:
             if args.domain:
-                parser.error("invalid domain name")
+                error("invalid domain name")
             else:
                 print("Invalid domain name", file=sys.stderr)
                 sys.exit(1)
-        master = getpass.getpass("Master password: ") + args.salt
+        if args.agent:
+            from . import agent
+            try:
+                with agent.Client() as client:
+                    if args.pin:
+                        print(client.generate_pin(domain, args.pinlength,
+                                                  args.salt))
+                    else:
+                        passwords = [client.generate(domain, length,
+                                                     args.algorithm,
+                                                     args.salt)
+                                     for length in args.length]
+                        for length, password in zip(args.length, passwords):
+                            if len(args.length) == 1:
+                                print(password)
+                            else:
+                                print("{}\t{}".format(length, password))
+                sys.exit()
+            except OSError:
+                pass  # no agent running, ask the master password
+            except agent.AgentError as e:
+                print("Not using the agent: {}".format(e), file=sys.stderr)
+        master = getpass.getpass("Master password: ")
         if args.pin:
-            print(generate_pin(master, domain, args.pinlength))
+            print(generate_pin(master, domain, args.pinlength, args.salt))
+        elif len(args.length) == 1:
+            print(generate(master, domain, args.length[0], args.algorithm,
+                           args.salt))
         else:
-            print(generate(master, domain, args.length, args.algorithm))
+            passwords = generate_lengths(master, domain, args.length,
+                                         args.algorithm, args.salt)
+            for length, password in zip(args.length, passwords):
+                print("{}\t{}".format(length, password))
     except KeyboardInterrupt:
         print()
+if args.stats:
+    from . import instrument
+    sys.stdout.flush()
+    instrument.report(stats())
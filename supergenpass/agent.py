@@ -0,0 +1,361 @@
+# SuperGenPass agent
+# Copyright (C) 2012-2013  Vianney le Clément de Saint-Marcq <vleclement@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Resident agent holding the master password, in the spirit of ssh-agent.
+
+The agent listens on a Unix socket only accessible to the current user.
+Each message, in both directions, is a JSON object encoded in UTF-8 and
+preceded by its length as a 4-byte big-endian integer. Requests hold an
+'op' key and the arguments of the operation:
+
+* {"op": "generate", "domain": ..., "length": ..., "algorithm": ...,
+  "salt": ...}
+* {"op": "generate_pin", "domain": ..., "length": ..., "salt": ...}
+* {"op": "strip_domain", "domain": ...}
+* {"op": "stop"}
+
+The salt is optional; if given, the agent refuses to derive unless it is the
+salt of the agent. Responses hold either a 'result' or an 'error' key. The
+agent forgets the master password and exits after a period without
+requests.
+
+The socket must be in a directory owned by the current user and accessible
+to no one else, and both ends check that the peer runs as the same user
+where the platform tells (SO_PEERCRED).
+
+"""
+
+import os
+import os.path
+import hmac
+import json
+import stat
+import socket
+import struct
+from . import Generator, strip_domain, _parse_algorithm
+
+
+# Maximum size of a message
+max_message = 1 << 16
+
+_header = struct.Struct('>I')
+
+
+class AgentError(Exception):
+
+    """Error reported by the agent or while talking to it."""
+
+
+def socket_path():
+    """Return the path of the agent socket.
+
+    The path is taken from the SUPERGENPASS_AGENT_SOCK environment variable
+    if set, and defaults to supergenpass/agent.sock in XDG_RUNTIME_DIR (or in
+    a per-user directory in /tmp).
+
+    """
+    if os.environ.get('SUPERGENPASS_AGENT_SOCK'):
+        return os.environ['SUPERGENPASS_AGENT_SOCK']
+    if os.environ.get('XDG_RUNTIME_DIR'):
+        directory = os.path.join(os.environ['XDG_RUNTIME_DIR'],
+                                 'supergenpass')
+    else:
+        directory = os.path.join('/tmp', 'supergenpass-{}'.format(os.getuid()))
+    return os.path.join(directory, 'agent.sock')
+
+
+def _check_directory(path):
+    """Raise AgentError unless the directory of the socket path is a real
+    directory owned by the current user and private to them."""
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        st = os.lstat(directory)
+    except OSError as e:
+        raise AgentError("can't access {}: {}".format(directory, e.strerror))
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or \
+            st.st_mode & 0o077:
+        raise AgentError("{} is not a private directory of the current user"
+                         .format(directory))
+
+
+def _peer_uid(sock):
+    """Return the user id of the peer of the Unix socket sock, or None if
+    the platform does not tell."""
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return None
+    credentials = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED,
+                                  struct.calcsize('3i'))
+    return struct.unpack('3i', credentials)[1]
+
+
+def _encode(salt):
+    return salt.encode('utf-8') if isinstance(salt, str) else bytes(salt)
+
+
+class Agent:
+
+    """Agent answering derivation requests with a fixed master password."""
+
+    def __init__(self, master, salt='', timeout=900):
+        """Initialize the agent.
+
+        Arguments:
+        master -- the master password
+        salt -- salt to append to the master password
+        timeout -- number of seconds without requests after which the agent
+                   stops, or None to run forever
+
+        """
+        self.timeout = timeout
+        self._master = master
+        self._salt = salt
+        self._generators = {}  # algorithm (None for PINs) -> Generator
+        self._server = None
+        self._timer = None
+        self._writers = set()
+
+    def _check_salt(self, request):
+        if 'salt' not in request:
+            return
+        if not isinstance(request['salt'], str):
+            raise AgentError("invalid salt")
+        if not hmac.compare_digest(_encode(request['salt']),
+                                   _encode(self._salt)):
+            raise AgentError("the salt differs from the salt of the agent")
+
+    def _generator(self, algorithm):
+        """Return a generator for algorithm (None for PINs) and whether it is
+        kept for the next requests.
+
+        Generators of plain hash algorithms are kept: there are only a few
+        of them, as unknown algorithms are refused. Those of key-stretching
+        algorithms, whose parameters are chosen by the clients, are built
+        for each request, the key derivation taking much longer anyway.
+
+        """
+        if algorithm in self._generators:
+            return self._generators[algorithm], True
+        if algorithm is None:
+            generator = Generator(self._master, self._salt)
+        else:
+            generator = Generator(self._master, self._salt, algorithm)
+            if _parse_algorithm(algorithm)[1] is not None:
+                return generator, False
+        self._generators[algorithm] = generator
+        return generator, True
+
+    async def handle(self, request):
+        """Process a request and return its result.
+
+        Derivations run in the default executor of the event loop, so that
+        a slow key-stretching algorithm holds neither the other clients nor
+        the timeout.
+
+        """
+        import asyncio
+        op = request.get('op')
+        if op in ('generate', 'generate_pin'):
+            self._check_salt(request)
+        if op == 'generate':
+            generator, kept = self._generator(request.get('algorithm', 'md5'))
+            derive = generator.password
+            length = request.get('length', 10)
+        elif op == 'generate_pin':
+            generator, kept = self._generator(None)
+            derive = generator.pin
+            length = request.get('length', 4)
+        elif op == 'strip_domain':
+            return strip_domain(request['domain'])
+        elif op == 'stop':
+            # stop once the response has been sent
+            asyncio.get_running_loop().call_soon(self.stop)
+            return None
+        else:
+            raise AgentError("unknown operation {!r}".format(op))
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                None, derive, request['domain'], length)
+        finally:
+            if not kept:
+                generator.wipe()
+
+    async def _serve_client(self, reader, writer):
+        import asyncio
+        sock = writer.get_extra_info('socket')
+        if sock is not None and _peer_uid(sock) not in (None, os.getuid()):
+            writer.close()
+            return
+        self._writers.add(writer)
+        try:
+            while True:
+                header = await reader.readexactly(_header.size)
+                size, = _header.unpack(header)
+                if size > max_message:
+                    break
+                message = await reader.readexactly(size)
+                self._reset_timer()
+                try:
+                    response = {'result': await self.handle(
+                        json.loads(message.decode()))}
+                except Exception as e:
+                    response = {'error': "{}: {}".format(type(e).__name__, e)}
+                message = json.dumps(response).encode()
+                writer.write(_header.pack(len(message)) + message)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    def _reset_timer(self):
+        if self.timeout is None:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        import asyncio
+        self._timer = asyncio.get_running_loop().call_later(self.timeout,
+                                                            self.stop)
+
+    def stop(self):
+        """Forget the master password and stop serving."""
+        self._master = self._salt = None
+        for generator in self._generators.values():
+            generator.wipe()
+        self._generators.clear()
+        if self._server is not None:
+            self._server.close()
+        for writer in self._writers:
+            writer.close()
+
+    async def serve(self, path=None):
+        """Serve requests on the Unix socket path (default: socket_path())
+        until the agent is stopped."""
+        import asyncio
+        if path is None:
+            path = socket_path()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        _check_directory(path)
+        if os.path.exists(path):
+            try:
+                Client(path).close()
+            except OSError:
+                os.unlink(path)  # stale socket
+            else:
+                raise AgentError("an agent is already listening on {}"
+                                 .format(path))
+        umask = os.umask(0o077)
+        try:
+            self._server = await asyncio.start_unix_server(self._serve_client,
+                                                           path)
+        finally:
+            os.umask(umask)
+        self._reset_timer()
+        try:
+            async with self._server:
+                try:
+                    await self._server.serve_forever()
+                except asyncio.CancelledError:
+                    pass
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def run(self, path=None):
+        """Run the agent until it is stopped."""
+        import asyncio
+        asyncio.run(self.serve(path))
+
+
+class Client:
+
+    """Blocking client of the agent."""
+
+    def __init__(self, path=None, timeout=5):
+        """Connect to the agent.
+
+        Arguments:
+        path -- path of the agent socket (default: socket_path())
+        timeout -- socket timeout in seconds
+
+        """
+        if path is None:
+            path = socket_path()
+        if not os.path.exists(path):
+            raise FileNotFoundError("no agent socket at {}".format(path))
+        _check_directory(path)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+        try:
+            self._socket.connect(path)
+            if _peer_uid(self._socket) not in (None, os.getuid()):
+                raise AgentError("the agent runs as another user")
+        except (OSError, AgentError):
+            self._socket.close()
+            raise
+
+    def close(self):
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _recv(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self._socket.recv(size - len(data))
+            if not chunk:
+                raise AgentError("connection closed by the agent")
+            data += chunk
+        return data
+
+    def request(self, op, **args):
+        """Send a request to the agent and return its result."""
+        args['op'] = op
+        message = json.dumps(args).encode()
+        self._socket.sendall(_header.pack(len(message)) + message)
+        size, = _header.unpack(self._recv(_header.size))
+        response = json.loads(self._recv(size).decode())
+        if 'error' in response:
+            raise AgentError(response['error'])
+        return response['result']
+
+    def generate(self, domain, length=10, algorithm='md5', salt=None):
+        """Derive a password with the master password of the agent. If salt
+        is not None, the agent refuses to derive with another salt."""
+        args = {} if salt is None else {'salt': salt}
+        return self.request('generate', domain=domain, length=length,
+                            algorithm=algorithm, **args)
+
+    def generate_pin(self, domain, length=4, salt=None):
+        """Derive a PIN with the master password of the agent. If salt is not
+        None, the agent refuses to derive with another salt."""
+        args = {} if salt is None else {'salt': salt}
+        return self.request('generate_pin', domain=domain, length=length,
+                            **args)
+
+    def strip_domain(self, domain):
+        """Strip a domain name/url with the agent."""
+        return self.request('strip_domain', domain=domain)
+
+    def stop(self):
+        """Stop the agent."""
+        self.request('stop')
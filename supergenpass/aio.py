@@ -0,0 +1,159 @@
+# SuperGenPass asyncio interface
+# Copyright (C) 2012-2013  Vianney le Clément de Saint-Marcq <vleclement@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Derive passwords and PINs from asyncio code without blocking the loop.
+
+The derivations run in an executor: the default executor of the loop (a
+thread pool) unless another one is given. Hash rounds mostly hold the GIL,
+so a thread pool keeps the loop responsive but slows it down under heavy
+load; a concurrent.futures.ProcessPoolExecutor keeps the latency of the
+loop flat. Cancelling a coroutine cancels the derivations that have not
+started yet.
+
+"""
+
+import asyncio
+import functools
+from . import generate, generate_pin
+from .batch import _passwords, _pins, _chunksize
+
+
+async def _offload(executor, semaphore, func, *args):
+    loop = asyncio.get_running_loop()
+    if semaphore is None:
+        return await loop.run_in_executor(executor, func, *args)
+    async with semaphore:
+        return await loop.run_in_executor(executor, func, *args)
+
+
+async def agenerate(master, domain, length=10, algorithm='md5', salt='',
+                    executor=None, semaphore=None):
+    """Derive a SuperGenPass password in an executor (see generate).
+
+    Arguments:
+    master, domain, length, algorithm, salt -- as for generate
+    executor -- concurrent.futures executor to use (default: the default
+                executor of the loop)
+    semaphore -- asyncio.Semaphore to acquire while deriving, to bound the
+                 number of derivations in flight (default: no bound)
+
+    """
+    return await _offload(executor, semaphore, generate, master, domain,
+                          length, algorithm, salt)
+
+
+async def agenerate_pin(master, domain, length=4, salt='', executor=None,
+                        semaphore=None):
+    """Derive a PIN in an executor (see generate_pin).
+
+    Arguments:
+    master, domain, length, salt -- as for generate_pin
+    executor -- concurrent.futures executor to use (default: the default
+                executor of the loop)
+    semaphore -- asyncio.Semaphore to acquire while deriving, to bound the
+                 number of derivations in flight (default: no bound)
+
+    """
+    return await _offload(executor, semaphore, generate_pin, master, domain,
+                          length, salt)
+
+
+async def _run(func, master, salt, requests, executor, concurrency,
+               chunksize, ordered):
+    loop = asyncio.get_running_loop()
+    requests = list(requests)
+    if chunksize is None:
+        chunksize = _chunksize(len(requests), concurrency)
+    chunks = iter(range(0, len(requests), chunksize))
+    pending = {}  # future -> start, in submission order
+
+    def submit():
+        for start in chunks:
+            chunk = requests[start:start+chunksize]
+            future = loop.run_in_executor(
+                executor, functools.partial(func, master, salt, chunk))
+            pending[future] = start
+            if len(pending) >= concurrency:
+                break
+
+    try:
+        submit()
+        while pending:
+            if ordered:
+                future, start = next(iter(pending.items()))
+                results = await future
+                del pending[future]
+            else:
+                done, _ = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                future = done.pop()
+                start = pending.pop(future)
+                results = future.result()
+            submit()
+            for index, result in enumerate(results, start):
+                yield result if ordered else (index, result)
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def agenerate_many(master, requests, salt='', executor=None, concurrency=8,
+                   chunksize=None, ordered=True):
+    """Derive SuperGenPass passwords for many domains in an executor.
+
+    Return an asynchronous iterator over the passwords, in the same order as
+    requests. If ordered is False, the iterator yields (index, password)
+    pairs as soon as they are available, index being the position of the
+    request. Requests are sent to the executor in chunks, at most
+    concurrency chunks at a time; closing the iterator cancels the chunks
+    not started yet.
+
+    Arguments:
+    master -- the master password
+    requests -- iterable of (domain, length, algorithm) tuples
+    salt -- salt to append to the master password
+    executor -- concurrent.futures executor to use (default: the default
+                executor of the loop)
+    concurrency -- maximum number of chunks in flight
+    chunksize -- number of requests sent to the executor at once (default:
+                 about 4 times as many chunks as concurrency)
+    ordered -- whether to yield the results in input order
+
+    """
+    return _run(_passwords, master, salt, requests, executor, concurrency,
+                chunksize, ordered)
+
+
+def agenerate_pins_many(master, requests, salt='', executor=None,
+                        concurrency=8, chunksize=None, ordered=True):
+    """Derive PINs for many domains in an executor.
+
+    Return an asynchronous iterator over the PINs, like agenerate_many.
+
+    Arguments:
+    master -- the master password
+    requests -- iterable of (domain, length) tuples
+    salt -- salt to append to the master password
+    executor -- concurrent.futures executor to use (default: the default
+                executor of the loop)
+    concurrency -- maximum number of chunks in flight
+    chunksize -- number of requests sent to the executor at once (default:
+                 about 4 times as many chunks as concurrency)
+    ordered -- whether to yield the results in input order
+
+    """
+    return _run(_pins, master, salt, requests, executor, concurrency,
+                chunksize, ordered)
@@ -0,0 +1,232 @@
+# SuperGenPass cost analysis
+# Copyright (C) 2012-2013  Vianney le Clément de Saint-Marcq <vleclement@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Estimate the cost of derivations by Monte Carlo sampling.
+
+A password needs 10 hash rounds, plus as many extra rounds as needed for
+its prefix to be valid. A PIN needs one HOTP, plus one per bad PIN
+rejected. Both depend on the inputs in a pseudo-random way: this module
+derives passwords and PINs for random (master, domain) pairs, gathers the
+distributions of extra rounds and PIN retries, and turns them into
+expected CPU costs with the measured time of a hash round or HOTP.
+
+"""
+
+import os
+import random
+import string
+import timeit
+import binascii
+import itertools
+import collections
+import concurrent.futures
+from . import Generator, _b64_table
+
+
+# Percentiles reported by default
+percentiles = (50, 90, 99, 99.9)
+
+# Number of samples drawn from each seed; fixed, so that the samples only
+# depend on the seed, not on the number of workers
+_chunk = 500
+
+# Top-level domains of the synthetic domain names
+_tlds = ['com', 'org', 'net', 'de', 'fr', 'co.uk', 'com.au', 'io']
+
+
+def _pair(rng):
+    """Return a random (master, domain) pair."""
+    master = ''.join(rng.choice(string.ascii_letters + string.digits +
+                                string.punctuation)
+                     for _ in range(rng.randint(8, 20)))
+    domain = ''.join(rng.choice(string.ascii_lowercase + string.digits)
+                     for _ in range(rng.randint(3, 15)))
+    return master, domain + '.' + rng.choice(_tlds)
+
+
+def _extra_rounds(generator, domain, lengths):
+    """Return a dictionary with the number of rounds beyond the first 10
+    needed by generator.password(domain, length) for each length."""
+    return {length: rounds - 10 for length, (_, rounds)
+            in generator._walk_lengths(domain, lengths).items()}
+
+
+def _pin_retries(generator, domain, lengths):
+    """Return a dictionary with the number of bad PINs rejected by
+    generator.pin(domain, length) for each length. The HMAC digests are
+    shared between lengths."""
+    domain = domain.encode('utf-8')
+    candidates = itertools.tee(generator._pin_candidates(domain),
+                               len(lengths))
+    return {length: generator._pin(domain, length, digests)[1]
+            for length, digests in zip(lengths, candidates)}
+
+
+def _sample(seed, count, algorithms, lengths, pin_lengths):
+    """Derive count random pairs. Return the histograms of extra rounds, by
+    (algorithm, length), and of PIN retries, by length."""
+    rng = random.Random(seed)
+    rounds = collections.defaultdict(collections.Counter)
+    retries = collections.defaultdict(collections.Counter)
+    for _ in range(count):
+        master, domain = _pair(rng)
+        for algorithm in algorithms:
+            generator = Generator(master, algorithm=algorithm)
+            for length, extra in _extra_rounds(generator, domain,
+                                               lengths).items():
+                rounds[algorithm, length][extra] += 1
+        if pin_lengths:
+            generator = Generator(master)
+            for length, run in _pin_retries(generator, domain,
+                                            pin_lengths).items():
+                retries[length][run] += 1
+    return dict(rounds), dict(retries)
+
+
+def _time(func):
+    """Return the time of a call to func, in seconds."""
+    number, elapsed = timeit.Timer(func).autorange()
+    return elapsed / number
+
+
+def _costs(algorithms, pin_lengths):
+    """Measure, for each algorithm, the time (in seconds) of creating a
+    generator and walking the 10 mandatory rounds (the first one being a key
+    derivation function for key-stretching algorithms), and of one extra
+    round. Likewise for PINs (under key None), with the time of creating a
+    generator and of one HOTP."""
+    costs = {}
+    b2a = binascii.b2a_base64
+    table = _b64_table
+    for algorithm in algorithms:
+        generator = Generator("master password", algorithm=algorithm)
+        password = generator._chain("example.com")
+        new = generator._new
+        fixed = _time(lambda: Generator("master password",
+                                        algorithm=algorithm)
+                      ._chain("example.com"))
+        step = _time(lambda: b2a(new(password).digest(),
+                                 newline=False).translate(table))
+        costs[algorithm] = fixed, step
+    if pin_lengths:
+        generator = Generator("master password")
+        step = _time(lambda: generator._hotp(b"example.com", 4))
+        costs[None] = _time(lambda: Generator("master password")) + step, step
+    return costs
+
+
+def _summary(histogram, fixed, step):
+    """Summarize a histogram of extra steps: mean, percentiles, maximum and
+    expected cost of a derivation, taking time fixed plus step per extra
+    step."""
+    total = sum(histogram.values())
+    mean = sum(value * count for value, count in histogram.items()) / total
+    histogram = dict(sorted(histogram.items()))
+    summary = {'mean': mean, 'max': max(histogram), 'percentiles': {},
+               'histogram': histogram, 'cost': fixed + mean * step}
+    for p in percentiles:
+        seen = 0
+        for value, count in histogram.items():
+            seen += count
+            if seen >= p / 100 * total:
+                summary['percentiles'][p] = value
+                break
+    summary['cost_p99'] = fixed + summary['percentiles'][99] * step
+    return summary
+
+
+def analyze(samples=100000, algorithms=('md5',), lengths=range(4, 25),
+            pin_lengths=range(3, 9), seed=None, executor=None, workers=None):
+    """Sample the number of rounds and PIN retries of random derivations.
+
+    Return a dictionary with keys 'passwords', mapping (algorithm, length)
+    pairs, and 'pins', mapping PIN lengths, to a summary of the distribution
+    of extra rounds (beyond the mandatory 10) or PIN retries. Each summary
+    is a dictionary with the following keys:
+
+    mean -- mean number of extra rounds or retries
+    percentiles -- dictionary mapping each of the percentiles (50, 90, 99
+                   and 99.9) to the number of extra rounds or retries
+    max -- maximum number of extra rounds or retries observed
+    histogram -- dictionary mapping each number of extra rounds or retries
+                 to the number of samples
+    cost -- expected CPU time of a derivation with a new generator, in
+            seconds, from the measured time of the mandatory rounds and of
+            an extra round or HOTP
+    cost_p99 -- CPU time of a derivation at the 99th percentile
+
+    Arguments:
+    samples -- number of random (master, domain) pairs
+    algorithms -- hash algorithms to analyze
+    lengths -- password lengths to analyze
+    pin_lengths -- PIN lengths to analyze
+    seed -- seed of the random pairs, for results reproducible whatever the
+            executor and number of workers
+    executor -- concurrent.futures executor to use (default: a new process
+                pool)
+    workers -- number of workers of the new process pool (default: number of
+               CPUs); with 1, everything is sampled in the current process
+
+    """
+    if samples < 1:
+        raise ValueError("at least one sample is needed")
+    algorithms = list(algorithms)
+    lengths = list(lengths)
+    pin_lengths = list(pin_lengths)
+    if seed is None:
+        seed = random.randrange(1 << 32)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    chunks = [("{}-{}".format(seed, start), min(_chunk, samples - start))
+              for start in range(0, samples, _chunk)]
+    rounds = collections.defaultdict(collections.Counter)
+    retries = collections.defaultdict(collections.Counter)
+
+    def merge(result):
+        for key, histogram in result[0].items():
+            rounds[key].update(histogram)
+        for key, histogram in result[1].items():
+            retries[key].update(histogram)
+
+    if executor is None and workers == 1:
+        for chunk_seed, count in chunks:
+            merge(_sample(chunk_seed, count, algorithms, lengths,
+                          pin_lengths))
+    else:
+        own = executor is None
+        if own:
+            executor = concurrent.futures.ProcessPoolExecutor(workers)
+        try:
+            futures = [executor.submit(_sample, chunk_seed, count,
+                                       algorithms, lengths, pin_lengths)
+                       for chunk_seed, count in chunks]
+            for future in concurrent.futures.as_completed(futures):
+                merge(future.result())
+        finally:
+            if own:
+                executor.shutdown(cancel_futures=True)
+
+    costs = _costs(algorithms, pin_lengths)
+    result = {'samples': samples, 'seed': seed, 'passwords': {}, 'pins': {}}
+    for algorithm in algorithms:
+        fixed, step = costs[algorithm]
+        for length in lengths:
+            result['passwords'][algorithm, length] = \
+                _summary(rounds[algorithm, length], fixed, step)
+    for length in pin_lengths:
+        fixed, step = costs[None]
+        result['pins'][length] = _summary(retries[length], fixed, step)
+    return result
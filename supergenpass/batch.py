@@ -0,0 +1,174 @@
+# SuperGenPass batch derivation
+# Copyright (C) 2012-2013  Vianney le Clément de Saint-Marcq <vleclement@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Derive passwords and PINs for many domains over a pool of workers."""
+
+import os
+import concurrent.futures
+from . import Generator
+
+
+def _passwords(master, salt, chunk):
+    """Derive the passwords of a chunk of (domain, length, algorithm)
+    requests."""
+    generators = {}
+    result = []
+    try:
+        for domain, length, algorithm in chunk:
+            if algorithm not in generators:
+                generators[algorithm] = Generator(master, salt, algorithm)
+            result.append(generators[algorithm].password(domain, length))
+    finally:
+        for generator in generators.values():
+            generator.wipe()
+    return result
+
+
+def _pins(master, salt, chunk):
+    """Derive the PINs of a chunk of (domain, length) requests."""
+    with Generator(master, salt) as generator:
+        return [generator.pin(domain, length) for domain, length in chunk]
+
+
+def _rotate(old, new, pin, chunk):
+    """Derive the old and new passwords, or PINs, of a chunk of (domain,
+    length) requests."""
+    with Generator(*old) as before, Generator(*new) as after:
+        if pin:
+            return [(before.pin(domain, length), after.pin(domain, length))
+                    for domain, length in chunk]
+        return [(before.password(domain, length),
+                 after.password(domain, length))
+                for domain, length in chunk]
+
+
+def _chunksize(count, workers):
+    """Return a chunk size splitting count requests in about 4 chunks per
+    worker, so that the pool stays balanced while keeping the IPC overhead
+    low."""
+    return max(1, min(4096, -(-count // (workers * 4))))
+
+
+def _run(func, args, requests, executor, workers, chunksize, ordered):
+    """Call func(*args, chunk) for the chunks of requests, in the current
+    process or in executor, and yield the results."""
+    requests = list(requests)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if executor is None and workers == 1:
+        # Avoid the pool and IPC overhead altogether
+        results = func(*args, requests)
+        yield from results if ordered else enumerate(results)
+        return
+    if chunksize is None:
+        chunksize = _chunksize(len(requests), workers)
+    own = executor is None
+    if own:
+        executor = concurrent.futures.ProcessPoolExecutor(workers)
+    try:
+        futures = {}
+        for start in range(0, len(requests), chunksize):
+            chunk = requests[start:start+chunksize]
+            futures[executor.submit(func, *args, chunk)] = start
+        if ordered:
+            for future in futures:
+                yield from future.result()
+        else:
+            for future in concurrent.futures.as_completed(futures):
+                yield from enumerate(future.result(), futures[future])
+    finally:
+        if own:
+            executor.shutdown(cancel_futures=True)
+
+
+def generate_many(master, requests, salt='', executor=None, workers=None,
+                  chunksize=None, ordered=True):
+    """Derive SuperGenPass passwords for many domains in parallel.
+
+    Return an iterator over the passwords, in the same order as requests. If
+    ordered is False, the iterator yields (index, password) pairs as soon as
+    they are available, index being the position of the request.
+
+    Arguments:
+    master -- the master password
+    requests -- iterable of (domain, length, algorithm) tuples
+    salt -- salt to append to the master password
+    executor -- concurrent.futures executor to use (default: a new process
+                pool, shut down when the iterator is exhausted or closed)
+    workers -- number of workers of the new process pool (default: number of
+               CPUs); with 1, everything is derived in the current process
+    chunksize -- number of requests sent to a worker at once (default: about
+                 4 chunks per worker)
+    ordered -- whether to yield the results in input order
+
+    """
+    return _run(_passwords, (master, salt), requests, executor, workers,
+                chunksize, ordered)
+
+
+def generate_pins_many(master, requests, salt='', executor=None, workers=None,
+                       chunksize=None, ordered=True):
+    """Derive PINs for many domains in parallel.
+
+    Return an iterator over the PINs, in the same order as requests. If
+    ordered is False, the iterator yields (index, PIN) pairs as soon as they
+    are available, index being the position of the request.
+
+    Arguments:
+    master -- the master password
+    requests -- iterable of (domain, length) tuples
+    salt -- salt to append to the master password
+    executor -- concurrent.futures executor to use (default: a new process
+                pool, shut down when the iterator is exhausted or closed)
+    workers -- number of workers of the new process pool (default: number of
+               CPUs); with 1, everything is derived in the current process
+    chunksize -- number of requests sent to a worker at once (default: about
+                 4 chunks per worker)
+    ordered -- whether to yield the results in input order
+
+    """
+    return _run(_pins, (master, salt), requests, executor, workers,
+                chunksize, ordered)
+
+
+def rotate(old, new, requests, pin=False, executor=None, workers=None,
+           chunksize=None, ordered=True):
+    """Derive the passwords (or PINs) for many domains with two sets of
+    parameters, e.g., before and after changing the master password, the salt
+    or the algorithm.
+
+    Return an iterator over (old, new) pairs of passwords, in the same order
+    as requests. If ordered is False, the iterator yields (index, (old, new))
+    pairs as soon as they are available, index being the position of the
+    request.
+
+    Arguments:
+    old -- (master, salt, algorithm) tuple of the old parameters
+    new -- (master, salt, algorithm) tuple of the new parameters
+    requests -- iterable of (domain, length) tuples
+    pin -- whether to derive PINs instead of passwords (the algorithms are
+           then ignored)
+    executor -- concurrent.futures executor to use (default: a new process
+                pool, shut down when the iterator is exhausted or closed)
+    workers -- number of workers of the new process pool (default: number of
+               CPUs); with 1, everything is derived in the current process
+    chunksize -- number of requests sent to a worker at once (default: about
+                 4 chunks per worker)
+    ordered -- whether to yield the results in input order
+
+    """
+    return _run(_rotate, (tuple(old), tuple(new), pin), requests, executor,
+                workers, chunksize, ordered)
@@ -0,0 +1,141 @@
+# SuperGenPass result cache
+# Copyright (C) 2012-2013  Vianney le Clément de Saint-Marcq <vleclement@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Bounded cache of derived passwords and PINs.
+
+Entries are keyed by a BLAKE2b digest of the inputs, keyed with a random
+secret drawn when the cache is created, so that the cache holds neither the
+master password nor anything from which it could be checked outside of the
+process. Values are kept in bytearrays, overwritten when they are evicted,
+expire or the cache is cleared. Expired entries are purged on every lookup
+and store, whichever key they are for.
+
+Use supergenpass.enable_cache rather than this module directly, unless a
+cache of one's own is needed (as in the GTK interface).
+
+"""
+
+import os
+import time
+import heapq
+import hashlib
+import threading
+import collections
+
+
+def _wipe(value):
+    if value is not None:
+        value[:] = bytes(len(value))
+
+
+class Cache:
+
+    """LRU cache of strings with a time to live."""
+
+    def __init__(self, maxsize=256, ttl=300):
+        """Initialize the cache.
+
+        Arguments:
+        maxsize -- maximum number of entries
+        ttl -- time (in seconds) after which an entry expires, or None to keep
+               entries until they are evicted
+
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._hash = hashlib.blake2b(key=os.urandom(32), digest_size=16)
+        self._entries = collections.OrderedDict()  # key -> (value, expiry)
+        self._expiries = []  # heap of (expiry, key), possibly outdated
+        self._lock = threading.Lock()
+
+    def _purge(self):
+        """Overwrite and remove the expired entries (with the lock held)."""
+        now = time.monotonic()
+        while self._expiries and self._expiries[0][0] <= now:
+            expiry, key = heapq.heappop(self._expiries)
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == expiry:
+                del self._entries[key]
+                _wipe(entry[0])
+
+    def key(self, *parts):
+        """Return the key of the given inputs: str (encoded in UTF-8) or
+        bytes-like objects, integers or None."""
+        h = self._hash.copy()
+        for part in parts:
+            if isinstance(part, str):
+                part = part.encode('utf-8')
+            elif isinstance(part, (int, type(None))):
+                part = repr(part).encode('ascii')
+            else:
+                part = memoryview(part).cast('B')
+            h.update(len(part).to_bytes(8, byteorder='big'))
+            h.update(part)
+        return h.digest()
+
+    def get(self, key, default=None):
+        """Return the value stored under key, or default if there is none or
+        it has expired."""
+        with self._lock:
+            self._purge()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return None if entry[0] is None else entry[0].decode('utf-8')
+
+    def put(self, key, value):
+        """Store value (a str or None) under key, evicting the least recently
+        used entry if the cache is full."""
+        if value is not None:
+            value = bytearray(value.encode('utf-8'))
+        expiry = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._purge()
+            old = self._entries.pop(key, None)
+            if old is not None:
+                _wipe(old[0])
+            self._entries[key] = value, expiry
+            if expiry is not None:
+                heapq.heappush(self._expiries, (expiry, key))
+            while len(self._entries) > self.maxsize:
+                _wipe(self._entries.popitem(last=False)[1][0])
+
+    def clear(self):
+        """Overwrite and remove all the entries."""
+        with self._lock:
+            for value, _ in self._entries.values():
+                _wipe(value)
+            self._entries.clear()
+            del self._expiries[:]
+
+    def info(self):
+        """Return a dictionary with the number of hits and misses, the number
+        of entries ('size') and the settings of the cache."""
+        with self._lock:
+            self._purge()
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self._entries), 'maxsize': self.maxsize,
+                    'ttl': self.ttl}
+
+    def __len__(self):
+        with self._lock:
+            self._purge()
+            return len(self._entries)
@@ -17,21 +17,213 @@
 import math
 import os.path
 import hashlib
-from gi.repository import Gtk, Gdk, GLib
+import threading
+import concurrent.futures
+import cairo
+from gi.repository import Gtk, Gdk, Gio, GLib
 from . import *
+from . import profiles
+from .cache import Cache
 
 
-class GtkUI:
+# Geometry of the visual hash
+radius = 8  # radius of the shapes defined below
+spacing = 2  # spacing between shapes
+shapewidth = radius * 2 + spacing  # width of a shape
+nwidth = 4  # width of canvas in shapes
 
-    """Gtk User Interface for SuperGenPass."""
+# Shapes of the visual hash, built on first use
+_shape_cache = []
 
-    def __init__(self, args):
-        """Initialize the GUI.
+
+def _shapes():
+    """Return the list of shapes (cairo paths) of the visual hash, centered on
+    the origin and of radius 8. The paths are built once per process."""
+    if _shape_cache:
+        return _shape_cache
+    cr = cairo.Context(cairo.ImageSurface(cairo.FORMAT_ARGB32, 1, 1))
+    shapes = []
+    # Circle
+    cr.arc(0, 0, radius, 0, 2 * math.pi)
+    shapes.append(cr.copy_path())
+    cr.new_path()
+    # Square
+    cr.rectangle(-radius, -radius, radius, radius)
+    shapes.append(cr.copy_path())
+    cr.new_path()
+    # Star
+    cr.move_to(0, -8.475681)
+    cr.line_to(1.893601, -2.597389)
+    cr.line_to(8.069343, -2.612960)
+    cr.line_to(3.063910, 1.004453)
+    cr.line_to(4.987128, 6.873122)
+    cr.line_to(0, 3.230514)
+    cr.line_to(-4.987129, 6.873122)
+    cr.rel_line_to(1.923218, -5.868669)
+    cr.rel_line_to(-5.005433, -3.617414)
+    cr.rel_line_to(6.175743, 0.015571)
+    cr.close_path()
+    shapes.append(cr.copy_path())
+    cr.new_path()
+    # Triangle
+    cr.move_to(-radius, radius)
+    cr.line_to(radius, radius)
+    cr.line_to(0, -radius)
+    cr.close_path()
+    shapes.append(cr.copy_path())
+    cr.new_path()
+    # Plus
+    cr.move_to(2.084458, -2.117061)
+    cr.rel_line_to(5.865234, 0)
+    cr.rel_line_to(0, 4.296875)
+    cr.rel_line_to(-5.865234, 0)
+    cr.rel_line_to(0, 5.865234)
+    cr.rel_line_to(-4.296875, 0)
+    cr.rel_line_to(0, -5.865234)
+    cr.rel_line_to(-5.865234, 0)
+    cr.rel_line_to(0, -4.296875)
+    cr.rel_line_to(5.865234, 0)
+    cr.rel_line_to(0, -5.875977)
+    cr.rel_line_to(4.296875, 0)
+    cr.close_path()
+    shapes.append(cr.copy_path())
+    cr.new_path()
+    # X
+    cr.move_to(3.723963, 0.060475)
+    cr.line_to(8.083338, 4.419850)
+    cr.line_to(4.438807, 8.064382)
+    cr.line_to(0.079432, 3.705007)
+    cr.line_to(-4.279943, 8.064382)
+    cr.line_to(-7.924475, 4.419850)
+    cr.rel_line_to(4.359375, -4.359375)
+    cr.rel_line_to(-4.359375, -4.359375)
+    cr.rel_line_to(3.644531, -3.644531)
+    cr.rel_line_to(4.359375, 4.359375)
+    cr.rel_line_to(4.359375, -4.371094)
+    cr.rel_line_to(3.644531, 3.644531)
+    cr.close_path()
+    shapes.append(cr.copy_path())
+    cr.new_path()
+    # Diamond
+    cr.move_to(0, -radius)
+    cr.line_to(radius, 0)
+    cr.line_to(0, radius)
+    cr.line_to(-radius, 0)
+    cr.close_path()
+    shapes.append(cr.copy_path())
+    cr.new_path()
+    # Small circle
+    cr.arc(0, 0, radius/2, 0, 2 * math.pi)
+    shapes.append(cr.copy_path())
+    cr.new_path()
+    _shape_cache.extend(shapes)
+    return _shape_cache
+
+
+# Delay (in milliseconds) between the last change and the derivation
+debounce_delay = 150
+
+# Maximum number of derived passwords kept for the current master password
+cache_size = 512
+
+# Number of recently used domains derived in advance
+speculate_recent = 5
+
+# Lengths of the passwords and PINs derived in advance
+speculate_lengths = range(4, 25)
+speculate_pinlengths = range(3, 9)
+
+
+def _derive(method, master, salt, domain, length, algorithm):
+    """Derive a password (method 0) or a PIN (method 1)."""
+    if method == 0:
+        return generate(master, domain, length, algorithm, salt)
+    else:
+        return generate_pin(master, domain, length, salt)
+
+
+def _speculate(master, salt, domain, algorithm, cancelled):
+    """Derive the passwords of speculate_lengths and the PINs of
+    speculate_pinlengths for domain. Return None if the event cancelled is
+    set before the passwords or the PINs are derived."""
+    with Generator(master, salt, algorithm) as generator:
+        if cancelled.is_set():
+            return None
+        passwords = generator.passwords(domain, speculate_lengths)
+        if cancelled.is_set():
+            return None
+        return passwords, [generator.pin(domain, length)
+                           for length in speculate_pinlengths]
+
+
+def _strip(domain):
+    """Return strip_domain(domain), or None if domain is empty or not a
+    valid domain name or URL (strip_domain raises ValueError for some
+    malformed URLs, e.g., while http://[ is being typed)."""
+    if not domain:
+        return None
+    try:
+        return strip_domain(domain)
+    except ValueError:
+        return None
+
+
+# Identifier of the application, used to find the running instance
+application_id = 'com.supergenpass.SuperGenPass'
+
+# Time (in seconds) the application stays resident once hidden and idle
+resident_timeout = 600
+
+# Time (in seconds) after which the derived password is cleared from the
+# clipboard
+clipboard_timeout = 120
+
+
+class GtkUI(Gtk.Application):
+
+    """Gtk User Interface for SuperGenPass.
+
+    The interface is a single-instance application: launching it again while
+    an instance is running re-presents the window of the running instance,
+    with the options of the new command line. Once hidden, the instance stays
+    resident for resident_timeout seconds, and at least until the derived
+    password has been cleared from the clipboard.
+
+    Passwords are derived in a background thread, once the inputs have not
+    changed for debounce_delay milliseconds. Results are kept in a cache
+    keyed by a digest of the inputs (see the cache module), overwritten when
+    the master password changes or the window is hidden.
+
+    Once the master password has been typed again in the confirmation field,
+    and neither has changed for debounce_delay milliseconds, another thread
+    derives in advance the passwords of all usual lengths and the PINs of
+    the domain name, of the domain found in the clipboard and of the
+    recently used domains (with their profile options), so that switching
+    between them, between password and PIN or between lengths needs no
+    derivation.
+
+    When the domain name has a profile (see the profiles module), its
+    options replace those of the command line. The domain entry completes
+    the domain names having a profile.
+
+    """
+
+    def __init__(self, parser):
+        """Initialize the application.
 
         Arguments:
-        args -- arguments given on the command line
+        parser -- parser of the command-line arguments (argparse)
 
         """
+        Gtk.Application.__init__(
+            self, application_id=application_id,
+            flags=Gio.ApplicationFlags.HANDLES_COMMAND_LINE)
+        self.parser = parser
+        self.set_inactivity_timeout(resident_timeout * 1000)
+
+    def do_startup(self):
+        """Build the window, once per instance."""
+        Gtk.Application.do_startup(self)
         # load custom style
         css = Gtk.CssProvider()
         css.load_from_path(os.path.join(data_dir, 'style.css'))
@@ -44,8 +236,23 @@ class GtkUI:
         builder.add_from_file(os.path.join(data_dir, 'main.ui'))
         # initialize members
         self.password = ''
+        self.master = ''
         self.masterhash = None
-        self.shapes = []
+        self.visualhash = None  # cached rendering of the visual hash
+        self.visualhash_key = None
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        # separate thread, so that derivations never queue behind speculation
+        self.speculator = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.speculation = []  # futures of the derivations in advance
+        self.speculation_cancelled = threading.Event()
+        self.pending_speculation = None  # GLib source of the speculation
+        self.speculated = False  # whether speculation started for the master
+        self.clipboard_domain = None
+        self.cache = Cache(cache_size, None)
+        self.cache_master = None
+        self.cache_generation = 0
+        self.pending = None  # GLib source of the debounced derivation
+        self.future = None  # derivation in progress
         self.window = builder.get_object('main')
         self.f_domain = builder.get_object('domain')
         self.f_master = builder.get_object('master')
@@ -62,39 +269,181 @@ class GtkUI:
         self.f_apply = builder.get_object('apply')
         self.f_expanders = [builder.get_object('expander1'),
                             builder.get_object('expander2')]
-        # setup options
-        self.method = 1 if args.pin else 0
-        self.f_method.set_current_page(self.method)
-        self.f_length.set_value(args.length)
-        self.f_pinlength.set_value(args.pinlength)
-        index = 0
+        self.f_options = {self.f_length: 'length',
+                          self.f_pinlength: 'pinlength',
+                          self.f_algorithm: 'algorithm',
+                          self.f_salt: 'salt'}
+        self.profiles = profiles.Profiles()
+        self.defaults = {}  # options of the command line
+        self.profile_domain = None  # domain whose options are applied
+        self.profiled = set()  # options set from the profile of that domain
+        self.edited = set()  # options set by hand since the window was shown
+        self.setting_options = False
+        self.completion_prefix = None
+        self.completion = Gtk.ListStore(str)
+        completion = Gtk.EntryCompletion()
+        completion.set_model(self.completion)
+        completion.set_text_column(0)
+        # the model only holds matching domains, see update_completion
+        completion.set_match_func(lambda *args: True)
+        self.f_domain.set_completion(completion)
+        # fill algorithms
+        self.algorithms = []
         for a in hashlib.algorithms_available:
             if a.islower() or a.lower() not in hashlib.algorithms_available:
                 self.f_algorithm.append_text(a)
-                if a in (args.algorithm, args.algorithm.lower()):
-                    self.f_algorithm.set_active(index)
-                index += 1
-        self.f_salt.set_text(args.salt, -1)
-        # try to get domain from clipboard
-        domain = Gtk.Clipboard.get(Gdk.SELECTION_PRIMARY).wait_for_text()
-        if domain:
-            domain = strip_domain(domain)
-        if not domain:
-            domain = Gtk.Clipboard.get(Gdk.SELECTION_CLIPBOARD).wait_for_text()
-            if domain:
-                domain = strip_domain(domain)
-        if domain:
-            self.f_domain.set_text(domain)
-            self.f_master.grab_focus()
-        else:
-            self.f_domain.grab_focus()
+                self.algorithms.append(a)
         # connect signals
         builder.connect_signals(self)
+        self.window.connect('delete-event', self.on_delete)
+
+    def do_shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.speculator.shutdown(wait=False, cancel_futures=True)
+        self.profiles.close()
+        Gtk.Application.do_shutdown(self)
+
+    def do_command_line(self, command_line):
+        """Present the window with the options of a new command line, given
+        to this instance or to another one."""
+        try:
+            args = self.parser.parse_args(command_line.get_arguments()[1:])
+        except SystemExit as e:
+            # invalid arguments (or --help) must not stop a resident instance
+            return e.code or 0
+        self.setup(args)
+        return 0
+
+    def setup(self, args):
+        """Reset the window with the given command-line options and present
+        it.
 
-    def run(self):
-        '''Launch the GUI.'''
+        Arguments:
+        args -- arguments given on the command line
+
+        """
+        # setup options
+        self.method = 1 if args.pin else 0
+        self.f_method.set_current_page(self.method)
+        self.defaults = {'length': args.length[0],
+                         'pinlength': args.pinlength,
+                         'algorithm': args.algorithm,
+                         'salt': args.salt}
+        self.profile_domain = None
+        self.profiled = set()
+        self.edited = set()
+        self.set_options(self.defaults)
+        # try to get domain from clipboard
+        self.clipboard_domain = None
+        self.f_domain.set_text("")
+        self.f_domain.grab_focus()
+        Gtk.Clipboard.get(Gdk.SELECTION_PRIMARY).request_text(
+            self.on_clipboard_text, Gdk.SELECTION_CLIPBOARD)
+        # show window
+        if self.window not in self.get_windows():
+            self.add_window(self.window)
         self.window.show_all()
-        Gtk.main()
+        self.window.present()
+
+    def set_options(self, options):
+        """Set the option widgets from a dictionary of options (some of
+        length, pinlength, algorithm and salt)."""
+        self.setting_options = True
+        try:
+            if 'algorithm' in options:
+                algorithm = options['algorithm']
+                if algorithm not in self.algorithms and \
+                        algorithm.lower() not in self.algorithms:
+                    # key-stretching algorithm, e.g., from the configuration
+                    self.f_algorithm.append_text(algorithm)
+                    self.algorithms.append(algorithm)
+                for index, a in enumerate(self.algorithms):
+                    if a in (algorithm, algorithm.lower()):
+                        self.f_algorithm.set_active(index)
+            if 'length' in options:
+                self.f_length.set_value(options['length'])
+            if 'pinlength' in options:
+                self.f_pinlength.set_value(options['pinlength'])
+            if 'salt' in options:
+                self.f_salt.set_text(options['salt'], -1)
+        finally:
+            self.setting_options = False
+
+    def profile_options(self, domain):
+        """Return the options of the command line, overridden by those of the
+        profile of domain (stripped), if any."""
+        profile = self.profiles.get(domain) if domain else None
+        options = dict(self.defaults)
+        if profile:
+            options.update((field, value) for field, value in profile.items()
+                           if field in options)
+        return options
+
+    def apply_profile(self, domain):
+        """Apply the profile of domain when the stripped domain changes.
+
+        The options of the profile, if any, are set; those set from the
+        profile of the previous domain go back to the command-line options.
+        Options the user set by hand since the window was shown are never
+        changed.
+
+        """
+        domain = _strip(domain)
+        if domain == self.profile_domain:
+            return
+        self.profile_domain = domain
+        options = {field: self.defaults[field] for field in self.profiled}
+        self.profiled = set()
+        profile = self.profiles.get(domain) if domain else None
+        if profile:
+            for field, value in profile.items():
+                if field in self.defaults:
+                    options[field] = value
+                    self.profiled.add(field)
+        self.profiled -= self.edited
+        self.set_options({field: value for field, value in options.items()
+                          if field not in self.edited})
+
+    def update_completion(self, domain):
+        """Fill the completion of the domain entry with the recently used
+        domains and the domains having a profile starting with domain."""
+        if domain == self.completion_prefix:
+            return
+        self.completion_prefix = domain
+        self.completion.clear()
+        if domain:
+            prefix = domain.lower()
+            matches = self.profiles.recent(prefix)
+            for match in self.profiles.search(prefix):
+                if match not in matches:
+                    matches.append(match)
+            for match in matches[:20]:
+                self.completion.append([match])
+
+    def on_clipboard_text(self, clipboard, text, fallback):
+        domain = _strip(text)
+        if domain:
+            self.clipboard_domain = domain
+            # do not overwrite a domain typed in the meantime
+            if not self.f_domain.get_text():
+                self.f_domain.set_text(domain)
+                self.f_master.grab_focus()
+        elif fallback is not None:
+            Gtk.Clipboard.get(fallback).request_text(self.on_clipboard_text,
+                                                     None)
+
+    def hide(self):
+        """Hide the window and forget the master password. The instance stays
+        resident until it has been idle for resident_timeout seconds."""
+        self.window.hide()
+        self.f_master.set_text("")
+        self.f_confirm.set_text("")
+        self.cancel_derivation()
+        self.cancel_speculation()
+        self.cache.clear()
+        self.cache_master = None
+        self.cache_generation += 1
+        self.remove_window(self.window)
 
     def update_password(self):
         if self.method == 0:  # Password
@@ -108,24 +457,36 @@ class GtkUI:
         self.f_apply.set_sensitive(bool(self.password))
 
     def on_cancel(self, *args):
-        Gtk.main_quit()
+        self.hide()
+
+    def on_delete(self, *args):
+        self.hide()
+        return True
 
     def on_method_changed(self, notebook, page, page_num):
         self.method = page_num
         self.on_changed()
 
     def on_changed(self, *args):
+        if args and not self.setting_options and args[0] in self.f_options:
+            self.edited.add(self.f_options[args[0]])
         domain = self.f_domain.get_text()
+        self.update_completion(domain)
+        self.apply_profile(domain)
         master = self.f_master.get_text()
         confirm = self.f_confirm.get_text()
+        # an empty confirmation is accepted, but does not trigger speculation
+        confirmed = bool(master) and master == confirm
         # Compute visual hash
-        if master:
-            masterhash = hashlib.sha1(master.encode()).digest()
-        else:
-            masterhash = None
-        if masterhash != self.masterhash:
-            self.masterhash = masterhash
-            self.f_visualhash.queue_draw()
+        if master != self.master:
+            self.master = master
+            if master:
+                masterhash = hashlib.sha1(master.encode()).digest()
+            else:
+                masterhash = None
+            if masterhash != self.masterhash:
+                self.masterhash = masterhash
+                self.f_visualhash.queue_draw()
         # Check confirmed password
         if not confirm:
             confirm = master
@@ -135,19 +496,138 @@ class GtkUI:
         else:
             ctx.remove_class('invalid')
         # Generate password
+        self.cancel_derivation()
+        if master and master == confirm:
+            # the salt is part of the cache keys, only a new master password
+            # invalidates the cache
+            new = self.cache_master is None or master != self.cache_master[0]
+            self.cache_master = (master, self.f_salt.get_text())
+            if new:
+                self.cache.clear()
+                self.cache_generation += 1
+                self.cancel_speculation()
+                self.speculated = False
+        if not confirmed:
+            if self.pending_speculation is not None:
+                GLib.source_remove(self.pending_speculation)
+                self.pending_speculation = None
+        elif not self.speculated and self.pending_speculation is None:
+            self.pending_speculation = GLib.timeout_add(debounce_delay,
+                                                        self.on_speculate)
         if domain and master and master == confirm:
-            master = master + self.f_salt.get_text()
             if self.method == 0:  # Password
-                self.password = generate(master, domain,
-                                         int(self.f_length.get_value()),
-                                         self.f_algorithm.get_active_text())
+                key = (0, domain, int(self.f_length.get_value()),
+                       self.f_algorithm.get_active_text())
             else:  # PIN
-                self.password = generate_pin(master, domain,
-                                             int(self.f_pinlength.get_value()))
+                key = (1, domain, int(self.f_pinlength.get_value()), None)
+            self.password = self.cache.get(
+                self.cache.key(*self.cache_master, *key), "")
+            if not self.password:
+                self.pending = GLib.timeout_add(debounce_delay,
+                                                self.on_derive, key)
         else:
             self.password = ""
         self.update_password()
 
+    def cancel_derivation(self):
+        """Cancel the scheduled derivation, if any."""
+        if self.pending is not None:
+            GLib.source_remove(self.pending)
+            self.pending = None
+        if self.future is not None:
+            self.future.cancel()
+            self.future = None
+
+    def on_derive(self, key):
+        self.pending = None
+        future = self.executor.submit(_derive, key[0], *self.cache_master,
+                                      *key[1:])
+        generation = self.cache_generation
+        # the salt may change before the result arrives
+        key = self.cache.key(*self.cache_master, *key)
+        future.add_done_callback(lambda future: GLib.idle_add(
+            self.on_derived, generation, key, future))
+        self.future = future
+        return False
+
+    def on_derived(self, generation, key, future):
+        if future.cancelled() or generation != self.cache_generation:
+            return False
+        if future is self.future:
+            self.future = None
+        self.cache.put(key, future.result())
+        # Show the result if the inputs did not change in the meantime
+        if self.pending is None and self.future is None:
+            self.on_changed()
+        return False
+
+    def on_speculate(self):
+        self.pending_speculation = None
+        self.speculated = True
+        self.speculate()
+        return False
+
+    def speculate(self):
+        """Derive in advance the passwords and PINs of the domain name, of the
+        clipboard domain and of the recently used domains."""
+        self.cancel_speculation()
+        self.speculation_cancelled = cancelled = threading.Event()
+        master = self.cache_master[0]
+        targets = {}
+        domain = self.f_domain.get_text()
+        if domain:
+            # with the options shown, which may have been edited
+            targets[domain] = (self.f_salt.get_text(),
+                               self.f_algorithm.get_active_text())
+        for domain in [self.clipboard_domain] + \
+                self.profiles.recent(limit=speculate_recent):
+            if domain and domain not in targets:
+                options = self.profile_options(_strip(domain))
+                algorithm = options['algorithm']
+                if algorithm not in self.algorithms:
+                    algorithm = algorithm.lower()  # as shown by set_options
+                targets[domain] = (options['salt'], algorithm)
+        generation = self.cache_generation
+        for domain, (salt, algorithm) in targets.items():
+            future = self.speculator.submit(_speculate, master, salt, domain,
+                                            algorithm, cancelled)
+            future.add_done_callback(
+                lambda future, domain=domain, salt=salt, algorithm=algorithm:
+                GLib.idle_add(self.on_speculated, generation, domain, salt,
+                              algorithm, future))
+            self.speculation.append(future)
+
+    def cancel_speculation(self):
+        """Cancel the scheduled derivations in advance, and stop those in
+        progress before their next step."""
+        if self.pending_speculation is not None:
+            GLib.source_remove(self.pending_speculation)
+            self.pending_speculation = None
+        self.speculation_cancelled.set()
+        for future in self.speculation:
+            future.cancel()
+        self.speculation = []
+
+    def on_speculated(self, generation, domain, salt, algorithm, future):
+        if future.cancelled() or generation != self.cache_generation:
+            return False
+        if future in self.speculation:
+            self.speculation.remove(future)
+        if future.result() is None:  # stopped
+            return False
+        passwords, pins = future.result()
+        master = self.cache_master[0]
+        for length, password in zip(speculate_lengths, passwords):
+            self.cache.put(self.cache.key(master, salt, 0, domain, length,
+                                          algorithm), password)
+        for length, pin in zip(speculate_pinlengths, pins):
+            self.cache.put(self.cache.key(master, salt, 1, domain, length,
+                                          None), pin)
+        # Show the result if it is the one waited for
+        if not self.password and domain == self.f_domain.get_text():
+            self.on_changed()
+        return False
+
     def on_show_password_toggled(self, checkbox):
         self.update_password()
 
@@ -158,108 +638,51 @@ class GtkUI:
         self.window.resize(self.window.get_size()[0], 1)
 
     def on_apply(self, button):
+        self.profiles.touch(self.f_domain.get_text())
         clipboard = Gtk.Clipboard.get(Gdk.SELECTION_CLIPBOARD)
         clipboard.set_text(self.password, len(self.password))
         clipboard.store()
-        GLib.timeout_add_seconds(120, self.on_timeout)
-        self.window.hide()
+        # stay alive until the clipboard has been cleared
+        self.hold()
+        GLib.timeout_add_seconds(clipboard_timeout, self.on_timeout,
+                                 self.password)
+        self.hide()
 
-    def on_timeout(self):
-        clipboard = Gtk.Clipboard.get(Gdk.SELECTION_CLIPBOARD)
-        if clipboard.wait_for_text() == self.password:
+    def on_timeout(self, password):
+        Gtk.Clipboard.get(Gdk.SELECTION_CLIPBOARD).request_text(
+            self.on_timeout_text, password)
+        return False
+
+    def on_timeout_text(self, clipboard, text, password):
+        if text == password:
             clipboard.set_text("", 0)
             clipboard.store()
-        Gtk.main_quit()
-        return False
+        self.release()
 
     def on_draw_visualhash(self, widget, cr):
         if not self.masterhash:
             return False
+        width = widget.get_allocated_width()
+        height = widget.get_allocated_height()
+        key = (self.masterhash, width, height)
+        if key != self.visualhash_key:
+            self.visualhash = self.render_visualhash(widget, width, height)
+            self.visualhash_key = key
+        cr.set_source_surface(self.visualhash, 0, 0)
+        cr.paint()
+        return False
 
-        radius = 8  # radius of the shapes defined below
-        spacing = 2  # spacing between shapes
-        shapewidth = radius * 2 + spacing  # width of a shape
-        nwidth = 4  # width of canvas in shapes
-
-        # Generate shapes based on radius 8
-        if not self.shapes:
-            # Circle
-            cr.arc(0, 0, radius, 0, 2 * math.pi)
-            self.shapes.append(cr.copy_path())
-            cr.new_path()
-            # Square
-            cr.rectangle(-radius, -radius, radius, radius)
-            self.shapes.append(cr.copy_path())
-            cr.new_path()
-            # Star
-            cr.move_to(0, -8.475681)
-            cr.line_to(1.893601, -2.597389)
-            cr.line_to(8.069343, -2.612960)
-            cr.line_to(3.063910, 1.004453)
-            cr.line_to(4.987128, 6.873122)
-            cr.line_to(0, 3.230514)
-            cr.line_to(-4.987129, 6.873122)
-            cr.rel_line_to(1.923218, -5.868669)
-            cr.rel_line_to(-5.005433, -3.617414)
-            cr.rel_line_to(6.175743, 0.015571)
-            cr.close_path()
-            self.shapes.append(cr.copy_path())
-            cr.new_path()
-            # Triangle
-            cr.move_to(-radius, radius)
-            cr.line_to(radius, radius)
-            cr.line_to(0, -radius)
-            cr.close_path()
-            self.shapes.append(cr.copy_path())
-            cr.new_path()
-            # Plus
-            cr.move_to(2.084458, -2.117061)
-            cr.rel_line_to(5.865234, 0)
-            cr.rel_line_to(0, 4.296875)
-            cr.rel_line_to(-5.865234, 0)
-            cr.rel_line_to(0, 5.865234)
-            cr.rel_line_to(-4.296875, 0)
-            cr.rel_line_to(0, -5.865234)
-            cr.rel_line_to(-5.865234, 0)
-            cr.rel_line_to(0, -4.296875)
-            cr.rel_line_to(5.865234, 0)
-            cr.rel_line_to(0, -5.875977)
-            cr.rel_line_to(4.296875, 0)
-            cr.close_path()
-            self.shapes.append(cr.copy_path())
-            cr.new_path()
-            # X
-            cr.move_to(3.723963, 0.060475)
-            cr.line_to(8.083338, 4.419850)
-            cr.line_to(4.438807, 8.064382)
-            cr.line_to(0.079432, 3.705007)
-            cr.line_to(-4.279943, 8.064382)
-            cr.line_to(-7.924475, 4.419850)
-            cr.rel_line_to(4.359375, -4.359375)
-            cr.rel_line_to(-4.359375, -4.359375)
-            cr.rel_line_to(3.644531, -3.644531)
-            cr.rel_line_to(4.359375, 4.359375)
-            cr.rel_line_to(4.359375, -4.371094)
-            cr.rel_line_to(3.644531, 3.644531)
-            cr.close_path()
-            self.shapes.append(cr.copy_path())
-            cr.new_path()
-            # Diamond
-            cr.move_to(0, -radius)
-            cr.line_to(radius, 0)
-            cr.line_to(0, radius)
-            cr.line_to(-radius, 0)
-            cr.close_path()
-            self.shapes.append(cr.copy_path())
-            cr.new_path()
-            # Small circle
-            cr.arc(0, 0, radius/2, 0, 2 * math.pi)
-            self.shapes.append(cr.copy_path())
-            cr.new_path()
+    def render_visualhash(self, widget, width, height):
+        """Render the visual hash of the master password into a new surface
+        of the given size, similar to the window of widget."""
+        surface = widget.get_window().create_similar_surface(
+            cairo.CONTENT_COLOR_ALPHA, width, height)
+        cr = cairo.Context(surface)
+        shapes = _shapes()
 
         # Setup cairo context
-        scale = min(widget.get_allocated_width() / (nwidth * shapewidth),
-                    widget.get_allocated_height() / (nwidth * shapewidth))
+        scale = min(width / (nwidth * shapewidth),
+                    height / (nwidth * shapewidth))
         cr.scale(scale, scale)
         cr.translate(shapewidth / 2, shapewidth / 2)
 
@@ -276,7 +699,7 @@ class GtkUI:
             cr.set_source_rgb(r, g, b)
             cr.save()
             cr.translate(x, y)
-            cr.append_path(self.shapes[symbol])
+            cr.append_path(shapes[symbol])
             cr.fill()
             cr.restore()
-        return False
+        return surface
@@ -0,0 +1,181 @@
+# SuperGenPass instrumentation
+# Copyright (C) 2012-2013  Vianney le Clément de Saint-Marcq <vleclement@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Opt-in statistics about the work done by the derivation functions.
+
+The derivation code itself holds no instrumentation. When statistics are
+enabled, the Generator methods and the helpers of strip_domain are replaced
+by the instrumented wrappers below, built on the same engine helpers as the
+originals (Generator._walk, _walk_lengths and _pin); disabling restores the
+originals. Hence nothing is paid unless statistics are enabled.
+
+Use supergenpass.enable_stats and supergenpass.stats rather than this module
+directly.
+
+"""
+
+import sys
+import time
+import threading
+import collections
+import supergenpass
+from . import Generator, _bad_pin_test
+from . import _compile_ip_address, _scan_host
+from . import _host as _host_original, _strip_host as _strip_host_original
+
+
+# Counters, described in supergenpass.stats
+counter_names = ['passwords', 'rounds', 'checks',
+                 'pins', 'pin_retries', 'pin_exhausted',
+                 'hosts', 'host_plain', 'host_scan', 'host_urlparse',
+                 'strips', 'strip_ip', 'strip_invalid', 'strip_suffix']
+
+_lock = threading.Lock()
+_counters = collections.Counter()
+_rounds = collections.Counter()
+_retries = collections.Counter()
+_latency = collections.defaultdict(collections.Counter)
+
+# Original functions replaced while enabled: (namespace, name) -> function
+_originals = {}
+
+
+def _record(kind, start, histogram=None, value=None, **counts):
+    """Add counts to the counters, the time elapsed since start (from
+    time.perf_counter_ns) to the latency histogram kind, and value to
+    histogram if given."""
+    elapsed = time.perf_counter_ns() - start
+    with _lock:
+        _counters.update(counts)
+        _latency[kind][1 << elapsed.bit_length()] += 1
+        if histogram is not None:
+            histogram[value] += 1
+
+
+def password(self, domain, length=10):
+    start = time.perf_counter_ns()
+    password, rounds = self._walk(domain, length)
+    _record('password', start, _rounds, rounds, passwords=1, rounds=rounds,
+            checks=rounds - 9)
+    return password
+
+
+def passwords(self, domain, lengths):
+    start = time.perf_counter_ns()
+    lengths = list(lengths)
+    results = self._walk_lengths(domain, lengths)
+    rounds = max((rounds for _, rounds in results.values()), default=10)
+    # each length is checked once per round until its password is valid
+    _record('password', start, _rounds, rounds, passwords=len(lengths),
+            rounds=rounds,
+            checks=sum(rounds - 9 for _, rounds in results.values()))
+    return [results[length][0] for length in lengths]
+
+
+def pin(self, domain, length=4):
+    start = time.perf_counter_ns()
+    if isinstance(domain, str):
+        domain = domain.encode('utf-8')
+    pin, run = self._pin(domain, length)
+    _record('pin', start, _retries, run, pins=1, pin_retries=run,
+            pin_exhausted=int(run == 100 and
+                              bool(_bad_pin_test(length)(pin))))
+    return ("{:0" + str(length) + "d}").format(pin)
+
+
+def _host(domain):
+    start = time.perf_counter_ns()
+    result = _host_original(domain)
+    if '/' not in domain and ':' not in domain:
+        _record('host', start, hosts=1, host_plain=1)
+    elif _scan_host(domain.lower()) is None:
+        _record('host', start, hosts=1, host_urlparse=1)
+    else:
+        _record('host', start, hosts=1, host_scan=1)
+    return result
+
+
+def _strip_host(domain):
+    start = time.perf_counter_ns()
+    result = _strip_host_original(domain)
+    if domain[:1].isdigit() and \
+            (supergenpass._ip_address or _compile_ip_address()).match(domain):
+        _record('strip', start, strips=1, strip_ip=1)
+    elif result is None:
+        _record('strip', start, strips=1, strip_invalid=1)
+    else:
+        _record('strip', start, strips=1, strip_suffix=1)
+    return result
+
+
+_instrumented = {(Generator, 'password'): password,
+                 (Generator, 'passwords'): passwords,
+                 (Generator, 'pin'): pin,
+                 (supergenpass, '_host'): _host,
+                 (supergenpass, '_strip_host'): _strip_host}
+
+
+def enable(enabled=True):
+    """Install (or remove) the instrumented functions."""
+    with _lock:
+        if enabled and not _originals:
+            for (namespace, name), function in _instrumented.items():
+                _originals[namespace, name] = getattr(namespace, name)
+                setattr(namespace, name, function)
+        elif not enabled and _originals:
+            for (namespace, name), function in _originals.items():
+                setattr(namespace, name, function)
+            _originals.clear()
+
+
+def snapshot(reset=False):
+    """Return a copy of the statistics, and clear them if reset is True."""
+    with _lock:
+        result = {name: _counters[name] for name in counter_names}
+        result['enabled'] = bool(_originals)
+        result['rounds_histogram'] = dict(sorted(_rounds.items()))
+        result['retries_histogram'] = dict(sorted(_retries.items()))
+        result['latency'] = {kind: dict(sorted(histogram.items()))
+                             for kind, histogram in sorted(_latency.items())}
+        if reset:
+            _counters.clear()
+            _rounds.clear()
+            _retries.clear()
+            _latency.clear()
+    return result
+
+
+def _histogram(histogram):
+    return ", ".join("{}: {}".format(key, count)
+                     for key, count in histogram.items())
+
+
+def report(stats, file=sys.stderr):
+    """Print the statistics returned by snapshot in a readable form."""
+    for name in counter_names:
+        if stats[name]:
+            print("{:14} {}".format(name + ":", stats[name]), file=file)
+    if stats['rounds_histogram']:
+        print("chain lengths: " + _histogram(stats['rounds_histogram']),
+              file=file)
+    if stats['retries_histogram']:
+        print("PIN retries:   " + _histogram(stats['retries_histogram']),
+              file=file)
+    for kind, histogram in stats['latency'].items():
+        print("{:14} {}".format(
+            kind + " time:",
+            ", ".join("<{:.4g}us: {}".format(bound / 1000, count)
+                      for bound, count in histogram.items())), file=file)
@@ -0,0 +1,254 @@
+# SuperGenPass bad PIN index builder
+# Copyright (C) 2012-2013  Vianney le Clément de Saint-Marcq <vleclement@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Build and verify the bitmaps of bad PINs used by generate_pin.
+
+The bitmap for PINs of length N is stored in data/badpinsN.bin. Bit i (bit
+i & 7 of byte i >> 3) is set iff the PIN formatted from the integer i with N
+digits is a bad PIN according to _bad_pin. Missing bitmaps are not an error:
+generate_pin then falls back to _bad_pin.
+
+The bitmaps for 3 to 6 digits are shipped; those for 7 and 8 digits are
+built when the package is built (see build_missing).
+
+Usage: python -m supergenpass.pinindex {build,verify,check} [LENGTH...]
+
+"""
+
+import os.path
+import sys
+import argparse
+from . import data_dir, _bad_pin, _pin_blacklist
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# PIN lengths accepted by the command-line interface
+pin_lengths = range(3, 9)
+
+# Number of PINs handled at once when building with NumPy
+_numpy_block = 10 ** 6
+
+
+def filename(length):
+    """Return the path of the bitmap for PINs of given length."""
+    return os.path.join(data_dir, 'badpins{}.bin'.format(length))
+
+
+def _build_python(length):
+    bitmap = bytearray((10 ** length + 7) // 8)
+    fmt = "{:0" + str(length) + "d}"
+    for pin in range(10 ** length):
+        if _bad_pin(fmt.format(pin)):
+            bitmap[pin >> 3] |= 1 << (pin & 7)
+    return bytes(bitmap)
+
+
+def _bad_block_numpy(length, start, stop):
+    """Return a boolean array telling which PINs in [start, stop) are bad,
+    following the rules of _bad_pin."""
+    pins = numpy.arange(start, stop, dtype=numpy.int64)
+    digits = numpy.stack([pins // 10 ** (length - 1 - i) % 10
+                          for i in range(length)], axis=1).astype(numpy.int8)
+    bad = numpy.zeros(len(pins), dtype=bool)
+    if length == 4:
+        d = digits
+        # 19xx and 2000-2029
+        bad |= (d[:, 0] == 1) & (d[:, 1] == 9)
+        bad |= (d[:, 0] == 2) & (d[:, 1] == 0) & (d[:, 2] < 3)
+        # 1515
+        bad |= (d[:, 0] == d[:, 2]) & (d[:, 1] == d[:, 3])
+    if length % 2 == 0:
+        # all digits in pairs
+        bad |= (digits[:, 0::2] == digits[:, 1::2]).all(axis=1)
+    # numerical run
+    diff = digits[:, 1:] - digits[:, :-1]
+    bad |= (diff == diff[:, :1]).all(axis=1)
+    # partial numerical run
+    for i in range(length - 2):
+        bad |= ((digits[:, i] == digits[:, i+1]) &
+                (digits[:, i+1] == digits[:, i+2]))
+    # special numbers
+    for pin in _pin_blacklist:
+        if len(pin) == length and start <= int(pin) < stop:
+            bad[int(pin) - start] = True
+    return bad
+
+
+def _build_numpy(length):
+    count = 10 ** length
+    blocks = [_bad_block_numpy(length, start, min(start + _numpy_block, count))
+              for start in range(0, count, _numpy_block)]
+    return numpy.packbits(numpy.concatenate(blocks),
+                          bitorder='little').tobytes()
+
+
+def build(length, use_numpy=None):
+    """Compute the bitmap of bad PINs of given length and return it as a
+    bytes object.
+
+    Arguments:
+    length -- length of the PINs
+    use_numpy -- whether to compute the bitmap with NumPy (default: if
+                 available)
+
+    """
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    if use_numpy:
+        return _build_numpy(length)
+    else:
+        return _build_python(length)
+
+
+def verify(length, bitmap):
+    """Check bitmap against _bad_pin for PINs of given length. Return the list
+    of PINs (as strings) for which they disagree."""
+    if len(bitmap) != (10 ** length + 7) // 8:
+        raise ValueError("bitmap size does not match PIN length {}"
+                         .format(length))
+    fmt = "{:0" + str(length) + "d}"
+    errors = []
+    for pin in range(10 ** length):
+        bad = bool(bitmap[pin >> 3] >> (pin & 7) & 1)
+        if bad != _bad_pin(fmt.format(pin)):
+            errors.append(fmt.format(pin))
+    return errors
+
+
+def _structured(length):
+    """Yield the PINs of given length (as integers) singled out by the rules
+    of _bad_pin: numerical runs, digits in pairs and special numbers."""
+    for first in range(10):
+        for diff in range(-9, 10):
+            if 0 <= first + (length - 1) * diff <= 9:
+                yield int(''.join(str(first + i * diff)
+                                  for i in range(length)))
+    if length % 2 == 0:
+        for half in range(10 ** (length // 2)):
+            yield int(''.join(c + c for c in
+                              "{:0{}d}".format(half, length // 2)))
+    for pin in _pin_blacklist:
+        if len(pin) == length:
+            yield int(pin)
+
+
+def check(length, bitmap, samples=200000, seed=0):
+    """Spot-check bitmap against _bad_pin for PINs of given length: the PINs
+    singled out by the rules of _bad_pin, and a random sample of the others.
+    This is much faster than verify for long PINs. Return the list of PINs
+    (as strings) for which they disagree."""
+    import random
+    if len(bitmap) != (10 ** length + 7) // 8:
+        raise ValueError("bitmap size does not match PIN length {}"
+                         .format(length))
+    rng = random.Random(seed)
+    pins = set(_structured(length))
+    pins.update(rng.randrange(10 ** length)
+                for _ in range(min(samples, 10 ** length)))
+    fmt = "{:0" + str(length) + "d}"
+    errors = []
+    for pin in sorted(pins):
+        bad = bool(bitmap[pin >> 3] >> (pin & 7) & 1)
+        if bad != _bad_pin(fmt.format(pin)):
+            errors.append(fmt.format(pin))
+    return errors
+
+
+def build_missing(lengths=pin_lengths, use_numpy=None):
+    """Build the bitmaps of the given PIN lengths that do not exist yet, and
+    check them (fully up to 10**6 PINs, with check beyond). Return the list
+    of lengths built. Raise ValueError if a bitmap fails its check; it is
+    not written then.
+
+    Arguments:
+    lengths -- PIN lengths
+    use_numpy -- whether to compute the bitmaps with NumPy (default: if
+                 available)
+
+    """
+    built = []
+    for length in lengths:
+        if os.path.exists(filename(length)):
+            continue
+        bitmap = build(length, use_numpy)
+        if length <= 6:
+            errors = verify(length, bitmap)
+        else:
+            errors = check(length, bitmap)
+        if errors:
+            raise ValueError("bitmap of bad PINs of length {}: {} mismatches "
+                             "(e.g., {})".format(length, len(errors),
+                                                 ", ".join(errors[:5])))
+        with open(filename(length), 'wb') as f:
+            f.write(bitmap)
+        built.append(length)
+    return built
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m supergenpass.pinindex")
+    parser.description = "Build, verify or spot-check the bitmaps of bad " \
+                         "PINs."
+    parser.add_argument("command", choices=['build', 'verify', 'check'])
+    parser.add_argument("lengths", nargs='*', type=int, metavar="LENGTH",
+                        default=list(pin_lengths),
+                        help="PIN lengths (default: 3 to 8)")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--numpy", action='store_true', dest='use_numpy',
+                       default=None, help="build with NumPy")
+    group.add_argument("--no-numpy", action='store_false', dest='use_numpy',
+                       help="build without NumPy")
+    args = parser.parse_args()
+    if args.use_numpy and numpy is None:
+        parser.error("NumPy is not available")
+    for length in args.lengths:
+        if length not in pin_lengths:
+            parser.error("PIN length must be between 3 and 8")
+    status = 0
+    for length in args.lengths:
+        if args.command == 'build':
+            with open(filename(length), 'wb') as f:
+                f.write(build(length, args.use_numpy))
+            print("built", filename(length))
+        else:
+            try:
+                with open(filename(length), 'rb') as f:
+                    bitmap = f.read()
+                if args.command == 'verify':
+                    errors = verify(length, bitmap)
+                else:
+                    errors = check(length, bitmap)
+            except (OSError, ValueError) as e:
+                print("{}: {}".format(filename(length), e), file=sys.stderr)
+                status = 1
+                continue
+            if errors:
+                print("{}: {} mismatches (e.g., {})"
+                      .format(filename(length), len(errors),
+                              ", ".join(errors[:5])), file=sys.stderr)
+                status = 1
+            else:
+                print("verified" if args.command == 'verify' else "checked",
+                      filename(length))
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+# SuperGenPass per-site profiles
+# Copyright (C) 2012-2013  Vianney le Clément de Saint-Marcq <vleclement@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Per-site profiles overriding the default options for some domains.
+
+Profiles are stored in an SQLite database, keyed by the stripped domain
+name. Each profile may set any of the following options, the others keeping
+their defaults:
+
+length -- length of the password
+pinlength -- length of the PIN
+algorithm -- hash algorithm
+salt -- salt to append to the master password
+strip -- whether to strip the domain name (False to use it as entered)
+
+The database also keeps the history of the recently used domains, which
+the GTK interface completes and derives in advance. It lives in
+$XDG_DATA_HOME/supergenpass/profiles.db by default, or at the path in the
+SUPERGENPASS_PROFILES environment variable.
+
+"""
+
+import os
+import os.path
+
+
+# Options a profile may set
+fields = ('length', 'pinlength', 'algorithm', 'salt', 'strip')
+
+# Number of domains kept in the history
+history_size = 100
+
+_schema = """
+CREATE TABLE IF NOT EXISTS profiles (
+    domain TEXT PRIMARY KEY,
+    length INTEGER,
+    pinlength INTEGER,
+    algorithm TEXT,
+    salt TEXT,
+    strip INTEGER
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS recent (
+    domain TEXT PRIMARY KEY,
+    used REAL
+) WITHOUT ROWID;
+"""
+
+
+def _profile(row):
+    """Return the profile dictionary of a row of values of fields."""
+    profile = {field: value for field, value in zip(fields, row)
+               if value is not None}
+    if 'strip' in profile:
+        profile['strip'] = bool(profile['strip'])
+    return profile
+
+
+def database_path():
+    """Return the path of the profile database."""
+    if os.environ.get('SUPERGENPASS_PROFILES'):
+        return os.environ['SUPERGENPASS_PROFILES']
+    if os.environ.get('XDG_DATA_HOME'):
+        directory = os.environ['XDG_DATA_HOME']
+    else:
+        directory = os.path.expanduser(os.path.join('~', '.local', 'share'))
+    return os.path.join(directory, 'supergenpass', 'profiles.db')
+
+
+class Profiles:
+
+    """Store of per-site profiles.
+
+    The database is opened on first use. As long as nothing is stored,
+    lookups do not create it.
+
+    """
+
+    def __init__(self, path=None):
+        """Initialize the store.
+
+        Arguments:
+        path -- path of the database (default: database_path())
+
+        """
+        if path is None:
+            path = database_path()
+        self.path = path
+        self._db = None
+
+    def _connect(self, create=False):
+        """Return the connection to the database, or None if it does not
+        exist and create is False."""
+        if self._db is None:
+            if not create and not os.path.exists(self.path):
+                return None
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, mode=0o700, exist_ok=True)
+            import sqlite3  # only when there are profiles, for startup time
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.executescript(_schema)
+        return self._db
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get(self, domain):
+        """Return the profile of domain as a dictionary holding the options
+        it sets, or None if there is no profile for domain."""
+        db = self._connect()
+        if db is None:
+            return None
+        row = db.execute("SELECT " + ", ".join(fields) + " FROM profiles "
+                         "WHERE domain = ?", (domain,)).fetchone()
+        return None if row is None else _profile(row)
+
+    def set(self, domain, **options):
+        """Create or update the profile of domain with the given options.
+        Options set to None are reset to their defaults."""
+        for field in options:
+            if field not in fields:
+                raise TypeError("unknown option {!r}".format(field))
+        db = self._connect(create=True)
+        with db:
+            db.execute("INSERT OR IGNORE INTO profiles (domain) VALUES (?)",
+                       (domain,))
+            for field, value in options.items():
+                db.execute("UPDATE profiles SET " + field + " = ? "
+                           "WHERE domain = ?", (value, domain))
+
+    def delete(self, domain):
+        """Delete the profile of domain. Return whether it existed."""
+        db = self._connect()
+        if db is None:
+            return False
+        with db:
+            cursor = db.execute("DELETE FROM profiles WHERE domain = ?",
+                                (domain,))
+        return cursor.rowcount > 0
+
+    def search(self, prefix, limit=20):
+        """Return the domains starting with prefix that have a profile, in
+        alphabetical order, at most limit of them."""
+        db = self._connect()
+        if db is None:
+            return []
+        # A range on the primary key, unlike LIKE, uses the index
+        return [domain for domain, in db.execute(
+            "SELECT domain FROM profiles WHERE domain >= ? AND domain < ? "
+            "ORDER BY domain LIMIT ?", (prefix, prefix + '\U0010ffff',
+                                        limit))]
+
+    def items(self):
+        """Return an iterator over the (domain, profile) pairs."""
+        db = self._connect()
+        if db is None:
+            return
+        for row in db.execute("SELECT domain, " + ", ".join(fields) +
+                              " FROM profiles ORDER BY domain"):
+            yield row[0], _profile(row[1:])
+
+    def touch(self, domain):
+        """Record domain as the most recently used one. Only the
+        history_size most recent domains are kept."""
+        import time
+        db = self._connect(create=True)
+        with db:
+            db.execute("INSERT OR REPLACE INTO recent (domain, used) "
+                       "VALUES (?, ?)", (domain, time.time()))
+            db.execute("DELETE FROM recent WHERE domain NOT IN (SELECT "
+                       "domain FROM recent ORDER BY used DESC LIMIT ?)",
+                       (history_size,))
+
+    def recent(self, prefix='', limit=10):
+        """Return the recently used domains starting with prefix, most recent
+        first, at most limit of them."""
+        db = self._connect()
+        if db is None:
+            return []
+        return [domain for domain, in db.execute(
+            "SELECT domain FROM recent WHERE domain >= ? AND domain < ? "
+            "ORDER BY used DESC LIMIT ?", (prefix, prefix + '\U0010ffff',
+                                           limit))]
+
+    def clear_recent(self):
+        """Forget the recently used domains."""
+        db = self._connect()
+        if db is not None:
+            with db:
+                db.execute("DELETE FROM recent")